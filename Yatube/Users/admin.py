@@ -1,3 +1,11 @@
 from django.contrib import admin
 
-# Register your models here.
+from Users.models import Profile
+
+
+@admin.register(Profile)
+class ProfileAdmin(admin.ModelAdmin):
+    """Class for proper look and work with Profile model"""
+    list_display = ('user', 'followers_count', 'following_count',
+                    'posts_count')
+    readonly_fields = ('followers_count', 'following_count', 'posts_count')
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class UsersConfig(AppConfig):
     name = 'Users'
+
+    def ready(self):
+        from Users import signals  # noqa: F401
@@ -0,0 +1,76 @@
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from follows.models import Follow
+from posts.models import Comment, Post
+from Users.models import Profile
+from Users.profiles import normalize
+from Yatube.invalidation import invalidate, tag
+
+
+def shift(user_id, field, delta):
+    """Atomically change counter of user's profile"""
+    if user_id is not None:
+        Profile.objects.filter(user_id=user_id).update(
+            **{field: F(field) + delta})
+        invalidate(tag(User, user_id))
+
+
+def _count(queryset, by):
+    return Coalesce(Subquery(queryset.order_by().values(by).annotate(
+        count=Count('id')).values('count')), 0)
+
+
+def recount_follows(user_ids):
+    """Set followers and following counters of users' profiles to their
+    number of follows, right whatever was followed concurrently"""
+    if user_ids:
+        Profile.objects.filter(user_id__in=user_ids).update(
+            followers_count=_count(
+                Follow.objects.filter(author=OuterRef('user_id')), 'author'),
+            following_count=_count(
+                Follow.objects.filter(user=OuterRef('user_id')), 'user'))
+        invalidate(*(tag(User, user_id) for user_id in user_ids))
+
+
+def rebuild(user_ids=None):
+    """Recount all counters from scratch, comments of users' posts too.
+
+    Returns usernames differing from others only in case, which are left
+    without username key"""
+    users = User.objects.all()
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+    posts = dict(Post.objects.filter(author__in=users)
+                 .values_list('author').annotate(Count('id')))
+    followers = dict(Follow.objects.filter(author__in=users)
+                     .values_list('author').annotate(Count('id')))
+    following = dict(Follow.objects.filter(user__in=users)
+                     .values_list('user').annotate(Count('id')))
+    comments = (Comment.objects.filter(post=OuterRef('pk')).order_by()
+                .values('post').annotate(count=Count('id')).values('count'))
+    names = dict(users.values_list('pk', 'username'))
+    keys = {pk: normalize(username) for pk, username in names.items()}
+    with transaction.atomic():
+        Post.objects.filter(author__in=users).silent_update(
+            comments_count=Coalesce(Subquery(comments), 0))
+        Profile.objects.filter(user__in=users).delete()
+        repeated = Counter(keys.values())
+        taken = set(Profile.objects.filter(
+            username_key__in=repeated).values_list('username_key',
+                                                   flat=True))
+        collisions = {pk for pk, key in keys.items()
+                      if repeated[key] > 1 or key in taken}
+        Profile.objects.bulk_create(
+            Profile(user_id=pk,
+                    username_key=None if pk in collisions else keys[pk],
+                    posts_count=posts.get(pk, 0),
+                    followers_count=followers.get(pk, 0),
+                    following_count=following.get(pk, 0))
+            for pk in names)
+    invalidate(*(tag(User, pk) for pk in names))
+    return sorted(names[pk] for pk in collisions)
@@ -1,6 +1,9 @@
+from django import forms
 from django.contrib.auth import get_user_model
 from django.contrib.auth.forms import UserCreationForm
 
+from Users.profiles import username_key
+
 User = get_user_model()
 
 
@@ -9,3 +12,10 @@ class CreationForm(UserCreationForm):
     class Meta(UserCreationForm.Meta):
         model = User
         fields = ('first_name', 'last_name', 'username', 'email')
+
+    def clean_username(self):
+        username = self.cleaned_data['username']
+        if username_key(username) is None:
+            raise forms.ValidationError(
+                'Пользователь с таким именем уже существует')
+        return username
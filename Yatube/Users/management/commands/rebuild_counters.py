@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from Users import counters
+
+
+class Command(BaseCommand):
+    help = 'Recount followers, following, posts and post comments of users'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_ids', nargs='*', type=int,
+                            help='Recount only these users')
+
+    def handle(self, *args, **options):
+        collisions = counters.rebuild(options['user_ids'] or None)
+        if collisions:
+            self.stdout.write(self.style.WARNING(
+                'Usernames differing only in case, found only by exact '
+                'name: ' + ', '.join(collisions)))
+        self.stdout.write(self.style.SUCCESS('Counters rebuilt'))
@@ -1,3 +1,21 @@
+from django.contrib.auth.models import User
 from django.db import models
 
-# Create your models here.
+
+class Profile(models.Model):
+    """Denormalized counters shown in profile preview"""
+    user = models.OneToOneField(User, verbose_name="Пользователь",
+                                on_delete=models.CASCADE,
+                                related_name='profile')
+    username_key = models.CharField("Имя без учёта регистра", max_length=150,
+                                    unique=True, null=True, editable=False)
+    followers_count = models.PositiveIntegerField("Подписчиков", default=0)
+    following_count = models.PositiveIntegerField("Подписок", default=0)
+    posts_count = models.PositiveIntegerField("Записей", default=0)
+
+    def __str__(self):
+        return str(self.user)
+
+    class Meta:
+        verbose_name = "Профиль"
+        verbose_name_plural = "Профили"
@@ -0,0 +1,82 @@
+import hashlib
+import unicodedata
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import F, Q
+
+from Yatube.caching import get_or_compute
+from Yatube.invalidation import depend, tag
+from .models import Profile
+
+# Fields of user and profile cached by resolve, in order of model fields
+USER_FIELDS = ('id', 'username', 'first_name', 'last_name')
+PROFILE_FIELDS = ('id', 'followers_count', 'following_count', 'posts_count')
+
+
+def normalize(username):
+    """Form of username equal for names differing only in case or by
+    compatible Unicode characters"""
+    return unicodedata.normalize('NFKC', username).casefold()
+
+
+def username_key(username, user_id=None):
+    """Normalized username to store in profile, None when another user's
+    name differs from it only in case. Such names, left by deployments
+    older than keys, are resolved only exactly"""
+    key = normalize(username)
+    taken = User.objects.exclude(pk=user_id).filter(
+        Q(profile__username_key=key) |
+        Q(username__iexact=username, profile__username_key=None))
+    return None if taken.exists() else key
+
+
+def _build(row):
+    user = User.from_db(DEFAULT_DB_ALIAS, USER_FIELDS,
+                        row[:len(USER_FIELDS)])
+    profile = row[len(USER_FIELDS):]
+    if profile[0] is None:
+        # Known to have no profile, as after select_related
+        User.profile.related.set_cached_value(user, None)
+    else:
+        user.profile = Profile.from_db(
+            DEFAULT_DB_ALIAS, ('id', 'user_id', *PROFILE_FIELDS[1:]),
+            (profile[0], user.pk, *profile[1:]))
+    return user
+
+
+def _row(username, key, cache_key):
+    def compute():
+        # User found by key goes before one found by name
+        users = User.objects.filter(
+            Q(profile__username_key=key) |
+            Q(username=username, profile__username_key=None))
+        row = users.order_by(
+            F('profile__username_key').asc(nulls_last=True),
+        ).values_list(
+            *USER_FIELDS, *(f'profile__{name}' for name in PROFILE_FIELDS),
+            'profile__username_key',
+        ).first()
+        if row is not None:
+            depend(tag(User, row[0]))
+        return row
+    digest = hashlib.md5(cache_key.encode()).hexdigest()
+    return get_or_compute(f'profile_row:{digest}', compute,
+                          settings.PROFILE_CACHE_TIMEOUT)
+
+
+def resolve(username):
+    """User with profile by username in any case, None if there is none.
+
+    Found by unique normalized username of profile, or by exact username
+    for user without profile or its key, in one query, and cached till
+    user or their counters change, so resolving known user makes no
+    queries. Only names and counters shown on pages are cached, other
+    fields of user are deferred"""
+    key = normalize(username)
+    row = _row(username, key, key)
+    if row and row[-1] is None and row[1] != username:
+        # Cached for another name without key differing only in case
+        row = _row(username, key, f'{key}/{username}')
+    return row and _build(row[:-1])
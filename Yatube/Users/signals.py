@@ -0,0 +1,62 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete, post_init
+from django.dispatch import receiver
+
+from follows.models import Follow
+from posts.models import Post
+from Users import counters, profiles
+from Users.models import Profile
+from Yatube import invalidation
+from Yatube.invalidation import list_tag, tag
+
+invalidation.watch(User, lambda user: (list_tag(User), tag(User, user.pk)))
+
+
+@receiver(post_init, sender=User)
+def user_loaded(sender, instance, **kwargs):
+    instance._resolved_username = instance.__dict__.get('username')
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    if created:
+        key = profiles.username_key(instance.username, instance.pk)
+        Profile.objects.get_or_create(user=instance,
+                                      defaults={'username_key': key})
+    elif instance.username != instance._resolved_username:
+        key = profiles.username_key(instance.username, instance.pk)
+        Profile.objects.filter(user=instance).update(username_key=key)
+    instance._resolved_username = instance.username
+
+
+@receiver(post_init, sender=Post)
+def post_loaded(sender, instance, **kwargs):
+    instance._counted_author_id = instance.author_id
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.shift(instance.author_id, 'posts_count', 1)
+    elif instance.author_id != instance._counted_author_id:
+        counters.shift(instance._counted_author_id, 'posts_count', -1)
+        counters.shift(instance.author_id, 'posts_count', 1)
+    instance._counted_author_id = instance.author_id
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.shift(instance._counted_author_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        counters.shift(instance.user_id, 'following_count', 1)
+        counters.shift(instance.author_id, 'followers_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.shift(instance.user_id, 'following_count', -1)
+    counters.shift(instance.author_id, 'followers_count', -1)
@@ -1,3 +1,123 @@
-from django.test import TestCase
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from follows.models import Follow
+from posts.models import Post
+from Users import profiles
+from Users.models import Profile
+
+
+class CountersTest(TestCase):
+    """Test profile counters follow posts and subscriptions"""
+    def setUp(self) -> None:
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser',
+                                             password='difficult_password')
+        self.author = User.objects.create_user(username='author_username',
+                                               password='difficult_password')
+
+    def counters(self, user):
+        profile = Profile.objects.get(user=user)
+        return (profile.followers_count, profile.following_count,
+                profile.posts_count)
+
+    def test_counters_change_on_create_and_delete(self):
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(author=self.author, text='test',
+                                   title='new_title', slug='slug')
+        self.assertEqual(self.counters(self.author), (1, 0, 1))
+        self.assertEqual(self.counters(self.user), (0, 1, 0))
+        follow.delete()
+        post.delete()
+        self.assertEqual(self.counters(self.author), (0, 0, 0))
+        self.assertEqual(self.counters(self.user), (0, 0, 0))
+
+    def test_post_author_set_after_creation(self):
+        post = Post.objects.create(text='test', title='new_title', slug='slug')
+        post.author = self.author
+        post.save()
+        self.assertEqual(self.counters(self.author), (0, 0, 1))
+
+    def test_rebuild_repairs_drift(self):
+        Post.objects.create(author=self.author, text='test',
+                            title='new_title', slug='slug')
+        Follow.objects.create(user=self.user, author=self.author)
+        Profile.objects.update(followers_count=10, posts_count=0)
+        Profile.objects.filter(user=self.user).delete()
+        call_command('rebuild_counters', stdout=StringIO())
+        self.assertEqual(self.counters(self.author), (1, 0, 1))
+        self.assertEqual(self.counters(self.user), (0, 1, 0))
+
+    def test_profile_preview_shows_counters(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        response = self.client.get(
+            reverse('profile', args=[self.author.username]))
+        self.assertContains(response, 'Подписчиков: 1')
+
+
+class ProfileResolveTest(TestCase):
+    """Test users are resolved by username in any case from cache"""
+    def setUp(self) -> None:
+        cache.clear()
+        self.client = Client()
+        self.author = User.objects.create_user(username='Author',
+                                               password='difficult_password')
+        Post.objects.create(author=self.author, text='test',
+                            title='new_title', slug='slug')
+
+    def test_resolved_in_any_case_and_cached(self):
+        self.assertEqual(profiles.resolve('aUTHOR'), self.author)
+        with self.assertNumQueries(0):
+            author = profiles.resolve('author')
+        self.assertEqual(author.profile.posts_count, 1)
+        self.assertIsNone(profiles.resolve('unknown'))
+
+    def test_only_shown_fields_cached(self):
+        author = profiles.resolve('author')
+        self.assertTrue({'password', 'email', 'is_staff', 'is_active'} <=
+                        author.get_deferred_fields())
+        self.assertEqual(author.username, 'Author')
+
+    def test_renamed_user_resolved_by_new_name(self):
+        profiles.resolve('author')
+        self.author.username = 'writer'
+        self.author.save()
+        self.assertIsNone(profiles.resolve('author'))
+        self.assertEqual(profiles.resolve('Writer'), self.author)
+
+    def test_profile_redirects_to_right_case_and_unknown_is_404(self):
+        response = self.client.get(reverse('profile', args=['author']))
+        self.assertRedirects(response, reverse('profile', args=['Author']),
+                             status_code=301)
+        response = self.client.get(reverse('profile', args=['unknown']))
+        self.assertEqual(response.status_code, 404)
+        self.client.login(username='Author', password='difficult_password')
+        response = self.client.post(reverse('follow', args=['unknown']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_names_differing_only_in_case_left_without_key(self):
+        User.objects.bulk_create([User(username='AUTHOR')])
+        other = User.objects.get(username='AUTHOR')
+        out = StringIO()
+        call_command('rebuild_counters', stdout=out)
+        self.assertIn('AUTHOR, Author', out.getvalue())
+        self.assertFalse(Profile.objects.filter(
+            user__in=[self.author, other]).exclude(username_key=None))
+        created = User.objects.create_user(username='aUTHOR')
+        self.assertIsNone(created.profile.username_key)
+        cache.clear()
+        for user in (self.author, other, created):
+            self.assertEqual(profiles.resolve(user.username), user)
+
+    def test_signup_refuses_name_differing_in_case(self):
+        response = self.client.post(reverse('signup'), {
+            'username': 'AUTHOR', 'email': 'author@example.com',
+            'password1': 'difficult_password',
+            'password2': 'difficult_password'})
+        self.assertFormError(response, 'form', 'username',
+                             'Пользователь с таким именем уже существует')
@@ -0,0 +1,55 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.shortcuts import render
+from django.utils.decorators import classonlymethod
+from django.views import View
+
+render_async = sync_to_async(render)
+
+
+class AsyncView(View):
+    """View with async handlers.
+
+    View of Django 3.2 does not mark such views as coroutines, so handler
+    would call them from a thread and get a coroutine back"""
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        view._is_coroutine = asyncio.coroutines._is_coroutine
+        return view
+
+    async def http_method_not_allowed(self, request, *args, **kwargs):
+        return super().http_method_not_allowed(request, *args, **kwargs)
+
+    async def options(self, request, *args, **kwargs):
+        return super().options(request, *args, **kwargs)
+
+
+def _in_transaction():
+    return any(connection.in_atomic_block for connection in connections.all())
+
+
+def _isolated(call):
+    def run():
+        try:
+            return call()
+        finally:
+            close_old_connections()
+    return run
+
+
+async def gather(*calls):
+    """Results of independent database calls run concurrently.
+
+    Each call gets own thread and connection. Inside a transaction other
+    connections do not see its changes, so calls run one by one on the
+    request thread, as they do when ASYNC_PARALLEL_QUERIES is off"""
+    if (settings.ASYNC_PARALLEL_QUERIES and
+            not await sync_to_async(_in_transaction)()):
+        return await asyncio.gather(*(
+            sync_to_async(_isolated(call), thread_sensitive=False)()
+            for call in calls))
+    return [await sync_to_async(call)() for call in calls]
@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class YatubeConfig(AppConfig):
+    name = 'Yatube'
+
+    def ready(self):
+        from Yatube import metrics
+        metrics.instrument()
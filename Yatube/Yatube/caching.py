@@ -0,0 +1,130 @@
+import asyncio
+import math
+import random
+import time
+from functools import partial, wraps
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from Yatube.invalidation import collect, depend, invalidated_at
+from Yatube.metrics import record_cache
+from Yatube.replicas import primary
+
+
+def _lock_key(key):
+    return f'{key}:lock'
+
+
+def _store(key, compute, timeout, stale):
+    start = time.monotonic()
+    with primary():
+        value, tags, computed = collect(compute)
+    if value is not None:
+        delta = time.monotonic() - start
+        cache.set(key, (value, computed + timeout, delta, computed, tags),
+                  timeout + stale)
+    return value
+
+
+def _valid(entry):
+    if entry is None:
+        return False
+    value, expires, delta, computed, tags = entry
+    return not tags or invalidated_at(tags) <= computed
+
+
+def get_or_compute(key, compute, timeout, stale=None):
+    """Value of key, computed by one process at a time.
+
+    Value is kept stale seconds longer than timeout. When it goes stale,
+    or a bit earlier by chance growing with its compute time, one caller
+    takes lock and recomputes it while the rest keep getting old value.
+    On miss the rest wait for the lock holder a while, or till it
+    releases the lock without caching anything. Value depending on
+    invalidated tags is a miss. Result None is not cached.
+
+    Lock is taken by cache.add, atomic on database, Redis and memcached
+    caches. On the default file cache it is best effort, two callers
+    may rarely take it and compute at once.
+
+    Value is shared and outlives replica lag, so it is computed from
+    default database"""
+    stale = settings.CACHE_STALE_TIMEOUT if stale is None else stale
+    entry = cache.get(key)
+    if not _valid(entry):
+        entry = None
+    record_cache(entry is not None)
+    if entry is not None:
+        value, expires, delta, computed, tags = entry
+        depend(*tags)
+        early = delta * settings.CACHE_EARLY_REFRESH_BETA * math.log(
+            1 - random.random())
+        if (time.time() - early < expires or
+                not cache.add(_lock_key(key), 1, settings.CACHE_LOCK_TIMEOUT)):
+            return value
+    elif not cache.add(_lock_key(key), 1, settings.CACHE_LOCK_TIMEOUT):
+        deadline = time.monotonic() + settings.CACHE_LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            released = cache.get(_lock_key(key)) is None
+            entry = cache.get(key)
+            if _valid(entry):
+                depend(*entry[4])
+                return entry[0]
+            if released:
+                break
+        return _store(key, compute, timeout, stale)
+    try:
+        return _store(key, compute, timeout, stale)
+    finally:
+        cache.delete(_lock_key(key))
+
+
+def _cached_response(key, call, timeout, stale):
+    response = None
+
+    def compute():
+        nonlocal response
+        response = call()
+        if hasattr(response, 'render'):
+            response.render()
+        if response.status_code != 200 or response.cookies:
+            return None
+        return response.content, response['Content-Type']
+
+    cached = get_or_compute(key, compute, timeout, stale)
+    if response is None and cached is not None:
+        content, content_type = cached
+        response = HttpResponse(content, content_type=content_type)
+    return response
+
+
+def cache_view(timeout, stale=None, key_prefix='view'):
+    """Cache successful GET responses for anonymous users by full path.
+
+    Response is outdated by tags which view and fragments it renders
+    depend on"""
+    def decorator(view):
+        def cached(request, call):
+            if (request.method not in ('GET', 'HEAD') or
+                    request.user.is_authenticated):
+                return call()
+            return _cached_response(
+                f'{key_prefix}:{request.get_full_path()}', call, timeout,
+                stale)
+
+        if asyncio.iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                call = async_to_sync(partial(view, request, *args, **kwargs))
+                return await sync_to_async(cached)(request, call)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            return cached(request, partial(view, request, *args, **kwargs))
+        return wrapper
+    return decorator
@@ -0,0 +1,54 @@
+import asyncio
+from calendar import timegm
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def conditional(version):
+    """Like django condition decorator, for sync and async views.
+
+    version(request, *args, **kwargs) returns ETag and last modified time
+    of resource, so both come from one query. It is called for logged in
+    users only: pages of anonymous ones come from page cache and get ETag
+    from ConditionalGetMiddleware for free"""
+    def check(request, args, kwargs):
+        if (request.method not in ('GET', 'HEAD') or
+                not request.user.is_authenticated):
+            return None, None, None
+        etag, last_modified = version(request, *args, **kwargs)
+        etag = quote_etag(etag) if etag is not None else None
+        last_modified = (timegm(last_modified.utctimetuple())
+                         if last_modified else None)
+        response = get_conditional_response(request, etag=etag,
+                                            last_modified=last_modified)
+        return response, etag, last_modified
+
+    def finish(response, etag, last_modified):
+        if last_modified and not response.has_header('Last-Modified'):
+            response['Last-Modified'] = http_date(last_modified)
+        if etag and not response.has_header('ETag'):
+            response['ETag'] = etag
+        return response
+
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                response, etag, last_modified = await sync_to_async(check)(
+                    request, args, kwargs)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                return finish(response, etag, last_modified)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response, etag, last_modified = check(request, args, kwargs)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            return finish(response, etag, last_modified)
+        return wrapper
+    return decorator
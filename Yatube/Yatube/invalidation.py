@@ -0,0 +1,152 @@
+import time
+from contextvars import ContextVar
+
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_init, post_save
+
+_tag_functions = {}
+_listeners = {}
+_collected = ContextVar('cache_dependencies', default=None)
+_started = ContextVar('cache_computation_started', default=None)
+
+
+def _tag_key(tag):
+    return f'tag:{tag}'
+
+
+def tag(model, pk):
+    """Tag of one row of model, None for unsaved one"""
+    if pk is not None:
+        return f'{model._meta.label_lower}:{pk}'
+
+
+def list_tag(model):
+    """Tag of any row of model being added, changed or deleted"""
+    return model._meta.label_lower
+
+
+def tags_of(obj):
+    """Tags of watched model instance"""
+    return [tag for tag in _tag_functions[type(obj)](obj) if tag]
+
+
+def depend(*tags):
+    """Make cached artifact being computed depend on tags"""
+    collected = _collected.get()
+    if collected is not None:
+        collected.update(tag for tag in tags if tag)
+
+
+def collect(compute):
+    """Value of compute, tags it depends on, nested artifacts included,
+    and time it started at.
+
+    Tags not known yet count as invalidated when outermost computation
+    started, so artifacts computed before they were evicted are outdated"""
+    tags = set()
+    started = time.time()
+    tokens = (_collected.set(tags), _started.set(_started.get() or started))
+    try:
+        value = compute()
+    finally:
+        _collected.reset(tokens[0])
+        _started.reset(tokens[1])
+    invalidated_at(tags, _started.get() or started)
+    depend(*tags)
+    return value, tags, started
+
+
+def invalidated_at(tags, missing_at=None):
+    """Latest invalidation time of tags.
+
+    Tag never invalidated or evicted from cache counts as invalidated at
+    missing_at, just now by default"""
+    keys = [_tag_key(tag) for tag in tags]
+    times = cache.get_many(keys)
+    moment = missing_at or time.time()
+    missing = {key: moment for key in keys if key not in times}
+    if missing:
+        for key, moment in missing.items():
+            cache.add(key, moment, None)
+        times.update(cache.get_many(list(missing)))
+    return max(times.values(), default=0)
+
+
+def invalidate(*tags):
+    """Outdate every artifact depending on tags.
+
+    Done again after commit, so artifact computed from data of
+    not yet committed transaction does not outlive it"""
+    tags = {tag for tag in tags if tag}
+    if not tags:
+        return
+
+    def purge():
+        moment = time.time()
+        cache.set_many({_tag_key(tag): moment for tag in tags}, None)
+        for tag in tags:
+            for callback in _listeners.get(tag, ()):
+                callback()
+    purge()
+    transaction.on_commit(purge)
+
+
+def on_invalidate(tag, callback):
+    """Call callback whenever tag is invalidated by this process, to
+    drop what process keeps in its own memory"""
+    _listeners.setdefault(tag, []).append(callback)
+
+
+def _loaded(sender, instance, **kwargs):
+    if not instance.get_deferred_fields():
+        instance._cache_tags = tags_of(instance)
+
+
+def _changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields == frozenset({'last_login'}):
+        return
+    invalidate(*getattr(instance, '_cache_tags', ()), *tags_of(instance))
+    instance._cache_tags = tags_of(instance)
+
+
+def watch(model, tags):
+    """Invalidate tags of model instances when they change"""
+    _tag_functions[model] = tags
+    uid = f'invalidation:{model._meta.label_lower}'
+    post_init.connect(_loaded, sender=model, dispatch_uid=uid)
+    post_save.connect(_changed, sender=model, dispatch_uid=uid)
+    post_delete.connect(_changed, sender=model, dispatch_uid=uid)
+
+
+class InvalidatingQuerySet(models.QuerySet):
+    """QuerySet which invalidates tags of rows changed by update().
+
+    Tags are expected to be built from primary and foreign keys, so only
+    those are read, and rows are read again after update only if it
+    changes foreign keys"""
+    def _keys(self):
+        meta = self.model._meta
+        return self.model._base_manager.only(
+            'pk', *(field.attname for field in meta.concrete_fields
+                    if field.is_relation))
+
+    def update(self, **kwargs):
+        if self.model not in _tag_functions:
+            return super().update(**kwargs)
+        changed = list(self._keys().filter(pk__in=self.values('pk')))
+        rows = super().update(**kwargs)
+        if any(self.model._meta.get_field(name).is_relation
+               for name in kwargs):
+            changed += self._keys().filter(
+                pk__in=[obj.pk for obj in changed])
+        invalidate(*(tag for obj in changed for tag in tags_of(obj)))
+        return rows
+
+    update.alters_data = True
+
+    def silent_update(self, **kwargs):
+        """update() of columns which no cached artifact shows"""
+        return super().update(**kwargs)
+
+    silent_update.alters_data = True
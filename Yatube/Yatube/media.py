@@ -0,0 +1,22 @@
+import mimetypes
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponse
+
+
+def send_file(name):
+    """Response with media file checked by view.
+
+    With MEDIA_ACCEL_REDIRECT_URL set nginx sends file from its internal
+    location, so worker does not stream its bytes"""
+    if not settings.MEDIA_ACCEL_REDIRECT_URL:
+        return FileResponse(default_storage.open(name))
+    content_type, _ = mimetypes.guess_type(name)
+    response = HttpResponse(
+        content_type=content_type or 'application/octet-stream')
+    response['X-Accel-Redirect'] = (settings.MEDIA_ACCEL_REDIRECT_URL +
+                                    quote(name))
+    response['Cache-Control'] = 'private'
+    return response
@@ -0,0 +1,193 @@
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from threading import Lock
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, Http404
+from django.template.base import Template
+
+logger = logging.getLogger('yatube.metrics')
+
+FIELDS = ('requests', 'seconds', 'db_queries', 'db_seconds',
+          'template_seconds', 'cache_hits', 'cache_misses')
+
+_totals = defaultdict(lambda: dict.fromkeys(FIELDS, 0))
+_lock = Lock()
+_current = ContextVar('request_metrics', default=None)
+_render = Template.render
+
+
+class QueryBudgetExceeded(Exception):
+    """View made more queries than its query_budget"""
+
+
+class RequestMetrics:
+    """Metrics of one request, also used as database execute wrapper"""
+    def __init__(self):
+        self.queries = []
+        self.seconds = 0
+        self.db_seconds = 0
+        self.template_seconds = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.rendering = False
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - start
+            self.queries.append(sql)
+
+    def as_dict(self):
+        return {'requests': 1, 'seconds': self.seconds,
+                'db_queries': len(self.queries),
+                'db_seconds': self.db_seconds,
+                'template_seconds': self.template_seconds,
+                'cache_hits': self.cache_hits,
+                'cache_misses': self.cache_misses}
+
+
+def total(field):
+    """Sum of field over requests to all views since start"""
+    with _lock:
+        return sum(values[field] for values in _totals.values())
+
+
+def record_cache(hit):
+    """Count cache lookup of current request"""
+    metrics = _current.get()
+    if metrics is not None:
+        if hit:
+            metrics.cache_hits += 1
+        else:
+            metrics.cache_misses += 1
+
+
+def _record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def _watch(connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def _timed_render(self, context):
+    metrics = _current.get()
+    if metrics is None or metrics.rendering:
+        return _render(self, context)
+    metrics.rendering = True
+    start = time.perf_counter()
+    try:
+        return _render(self, context)
+    finally:
+        metrics.rendering = False
+        metrics.template_seconds += time.perf_counter() - start
+
+
+def instrument():
+    """Wrap template rendering and database connections to measure them,
+    once at startup, for requests watched by MetricsMiddleware"""
+    if Template.render is not _timed_render:
+        Template.render = _timed_render
+    connection_created.connect(_watch)
+    for connection in connections.all():
+        _watch(connection)
+
+
+class MetricsMiddleware:
+    """Collects metrics of request under resolved view name and checks
+    query_budget declared by view.
+
+    Queries are counted by wrapper of every connection, so queries which
+    async views run on other threads are counted as well. Wrappers are
+    installed by instrument() when the app is ready"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, metrics, start, response)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, metrics, start, response)
+
+    def finish(self, request, metrics, start, response):
+        metrics.seconds = time.perf_counter() - start
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        self.record(view, metrics)
+        self.check_budget(request, view, metrics)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = getattr(view_func, 'view_class', view_func)
+        request.query_budget = getattr(view, 'query_budget', None)
+
+    def record(self, view, metrics):
+        values = metrics.as_dict()
+        with _lock:
+            totals = _totals[view]
+            for field in FIELDS:
+                totals[field] += values[field]
+        logger.debug(json.dumps({'view': view, **values}))
+
+    def check_budget(self, request, view, metrics):
+        budget = getattr(request, 'query_budget', None)
+        if budget is None or len(metrics.queries) <= budget:
+            return
+        message = '{}: {} queries, budget {}\n{}'.format(
+            view, len(metrics.queries), budget, '\n'.join(
+                f'{number}. {sql}'
+                for number, sql in enumerate(metrics.queries, start=1)))
+        if settings.QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+def metrics_view(request):
+    """Metrics totals in Prometheus text format for internal clients"""
+    if (request.META.get('REMOTE_ADDR') not in settings.INTERNAL_IPS and
+            not request.user.is_staff):
+        raise Http404
+    lines = []
+    with _lock:
+        totals = {view: dict(values) for view, values in _totals.items()}
+    for field in FIELDS:
+        name = f'yatube_{field}_total'
+        lines.append(f'# TYPE {name} counter')
+        for view, values in sorted(totals.items()):
+            lines.append(f'{name}{{view="{view}"}} {values[field]}')
+    return HttpResponse('\n'.join(lines) + '\n',
+                        content_type='text/plain; version=0.0.4')
@@ -0,0 +1,113 @@
+import threading
+import time
+
+import psycopg2
+from django.db import OperationalError
+from django.db.backends.postgresql import base
+from django.utils.asyncio import async_unsafe
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _reset(connection):
+    """Roll back transaction left open, False if connection is broken"""
+    try:
+        if connection.info.transaction_status != TRANSACTION_STATUS_IDLE:
+            connection.rollback()
+        return not connection.closed
+    except psycopg2.Error:
+        connection.close()
+        return False
+
+
+def _usable(connection):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except psycopg2.Error:
+        connection.close()
+        return False
+    return _reset(connection)
+
+
+class ConnectionPool:
+    """Connections to one database shared by threads of process.
+
+    At most max_size connections are taken at once, taking one more waits
+    up to timeout seconds. Connection idle longer than check_after seconds
+    is checked by a query before it is handed out, broken ones are
+    dropped"""
+    def __init__(self, max_size=10, timeout=10, check_after=10):
+        self.timeout = timeout
+        self.check_after = check_after
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Idle connection, or None if caller has to connect itself and
+        release() the slot when that fails"""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise OperationalError('No free connection in pool for '
+                                   f'{self.timeout} seconds')
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                connection, since = self._idle.pop()
+            if (time.monotonic() - since < self.check_after or
+                    _usable(connection)):
+                return connection
+
+    def put(self, connection):
+        """Take back connection, closed one only frees its slot"""
+        try:
+            if _reset(connection):
+                with self._lock:
+                    self._idle.append((connection, time.monotonic()))
+        finally:
+            self.release()
+
+    def release(self):
+        self._slots.release()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL backend which takes connections from process wide pool
+    configured by OPTIONS['pool'] and gives them back on close.
+
+    Meant for CONN_MAX_AGE 0, so connection returns to pool at the end
+    of each request and is shared by threads of async views"""
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pool', None)
+        return params
+
+    def connection_pool(self, conn_params):
+        key = (self.alias, repr(sorted(conn_params.items())))
+        with _pools_lock:
+            if key not in _pools:
+                _pools[key] = ConnectionPool(
+                    **self.settings_dict['OPTIONS'].get('pool', {}))
+            return _pools[key]
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        self._pool = self.connection_pool(conn_params)
+        connection = self._pool.get()
+        if connection is not None:
+            self.isolation_level = self.settings_dict['OPTIONS'].get(
+                'isolation_level', connection.isolation_level)
+            return connection
+        try:
+            return super().get_new_connection(conn_params)
+        except BaseException:
+            self._pool.release()
+            raise
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self._pool.put(self.connection)
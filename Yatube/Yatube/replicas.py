@@ -0,0 +1,101 @@
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA = 'replica'
+PIN_COOKIE = 'primary_reads'
+
+_request = ContextVar('database_routing', default=None)
+_primary = ContextVar('primary_reads', default=False)
+
+
+class _Routing:
+    def __init__(self, replica):
+        self.replica = replica
+        self.wrote = False
+
+
+@contextmanager
+def primary():
+    """Read from default database inside block"""
+    token = _primary.set(True)
+    try:
+        yield
+    finally:
+        _primary.reset(token)
+
+
+class ReplicaRouter:
+    """Sends reads of GET requests to replica and everything else to
+    default database.
+
+    Reads go to default once request wrote, inside transactions and in
+    primary() blocks"""
+    def db_for_read(self, model, **hints):
+        routing = _request.get()
+        if (routing is None or not routing.replica or routing.wrote or
+                _primary.get() or
+                connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        routing = _request.get()
+        if routing is not None:
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaMiddleware:
+    """Lets ReplicaRouter send reads of GET requests to replica.
+
+    Client whose request wrote anything gets cookie which keeps its reads
+    on default database for REPLICA_PIN_SECONDS, longer than replica
+    lags, so it sees its own posts and comments"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def routing(self, request):
+        return _Routing(request.method in ('GET', 'HEAD') and
+                        PIN_COOKIE not in request.COOKIES)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        routing = self.routing(request)
+        token = _request.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request.reset(token)
+        return self.finish(routing, response)
+
+    async def __acall__(self, request):
+        routing = self.routing(request)
+        token = _request.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request.reset(token)
+        return self.finish(routing, response)
+
+    def finish(self, routing, response):
+        if routing.wrote:
+            response.set_cookie(PIN_COOKIE, '1',
+                                max_age=settings.REPLICA_PIN_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
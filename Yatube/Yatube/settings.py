@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 
@@ -25,7 +26,7 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 SECRET_KEY = 'g9du!va9-q+t)$zv6z6ca^@7rfvgf(-+nw&4bq%46maabxe!xb'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get('DEBUG', '').lower() in ('1', 'true', 'yes')
 
 ALLOWED_HOSTS = [
     "localhost",
@@ -47,16 +48,18 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'django.contrib.sites',
     'django.contrib.flatpages',
-    "debug_toolbar",
-    'sorl.thumbnail',
+    'api',
     'follows',
+    'jobs',
     'posts',
     'Users',
+    'Yatube.apps.YatubeConfig',
 ]
 
 MIDDLEWARE = [
-    "debug_toolbar.middleware.DebugToolbarMiddleware",
+    'Yatube.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -65,6 +68,10 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+if DEBUG:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.insert(1, 'debug_toolbar.middleware.DebugToolbarMiddleware')
+
 ROOT_URLCONF = 'Yatube.urls'
 
 TEMPLATES = [
@@ -84,6 +91,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'Yatube.wsgi.application'
+ASGI_APPLICATION = 'Yatube.asgi.application'
 
 
 # Database
@@ -100,9 +108,34 @@ DATABASES = {
         'PASSWORD': os.environ.get('POSTGRES_PASSWORD'),
         'HOST': os.environ.get('DB_HOST'),
         'PORT': os.environ.get('DB_PORT'),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 0)),
     }
 }
 
+# Production profile: each process keeps connections in pool, checks
+# ones idle for a while before use and takes them back after request
+if os.environ.get('DB_POOL_SIZE'):
+    DATABASES['default'].update({
+        'ENGINE': 'Yatube.postgresql_pool',
+        'CONN_MAX_AGE': 0,
+        'OPTIONS': {'pool': {
+            'max_size': int(os.environ['DB_POOL_SIZE']),
+            'timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            'check_after': int(os.environ.get('DB_POOL_CHECK_AFTER', 10)),
+        }},
+    })
+
+# Reads of GET requests go to replica, writers keep reading from default
+# for REPLICA_PIN_SECONDS after their write
+REPLICA_PIN_SECONDS = 10
+if os.environ.get('DB_REPLICA_HOST'):
+    DATABASES['replica'] = dict(
+        DATABASES['default'], HOST=os.environ['DB_REPLICA_HOST'],
+        PORT=os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        TEST={'MIRROR': 'default'})
+    DATABASE_ROUTERS = ['Yatube.replicas.ReplicaRouter']
+    MIDDLEWARE.insert(1, 'Yatube.replicas.ReplicaMiddleware')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -122,12 +155,56 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Cache has to be shared by all web and job worker processes. Files of the
+# default are shared only within one host or container, across containers
+# use database cache table (manage.py createcachetable) or Redis with
+# django-redis installed, e.g.
+# CACHE_BACKEND=django_redis.cache.RedisCache CACHE_LOCATION=redis://redis:6379
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get(
+            'CACHE_LOCATION',
+            os.path.join(tempfile.gettempdir(), 'yatube_cache')),
     }
 }
 
+# Stale values are served this long after timeout while one worker
+# recomputes them
+CACHE_STALE_TIMEOUT = 60
+
+# Values are recomputed earlier by chance, more eager for slow ones
+CACHE_EARLY_REFRESH_BETA = 1.0
+
+# Recomputation lock lifetime and how long others wait for missing value
+CACHE_LOCK_TIMEOUT = 30
+CACHE_LOCK_WAIT = 5
+
+# Rendered post cards are outdated by changes of post, author or group
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Pages for anonymous users are outdated by invalidation of what they show
+PAGE_CACHE_TIMEOUT = 60 * 60
+
+# Users resolved by username are outdated by changes of them and counters
+PROFILE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Post ids by author and slug are dropped when posts change address
+POST_ID_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Groups resolved by slug are kept in process memory, changes made by other
+# processes are noticed at most this many seconds later
+GROUP_SLUG_CHECK_INTERVAL = 1
+
+# Groups per page of group directory
+GROUP_LIST_PAGE_SIZE = 20
+
+# Old numbered ?page= links are served up to this page, deeper ones are 404
+# as COUNT and OFFSET grow with them
+LEGACY_PAGE_MAX = 10
+
 test_cache = {
     'default': {
         'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
@@ -153,9 +230,13 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, "static")
+STATICFILES_STORAGE = 'Yatube.storage.CompressedManifestStaticFilesStorage'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Internal nginx location of MEDIA_ROOT, files checked by views are sent
+# through X-Accel-Redirect to it instead of being streamed by workers
+MEDIA_ACCEL_REDIRECT_URL = os.environ.get('MEDIA_ACCEL_REDIRECT_URL')
 
 LOGIN_URL = "/auth/login/"
 LOGIN_REDIRECT_URL = "/"
@@ -171,4 +252,48 @@ INTERNAL_IPS = [
     "127.0.0.1",
 ]
 
+# Raise instead of logging when view makes more queries than its budget
+QUERY_BUDGET_STRICT = False
+
 DEFAULT_AUTO_FIELD='django.db.models.AutoField'
+
+# Background jobs are run by manage.py runworker with this many processes
+# of this many threads each
+JOB_WORKER_PROCESSES = int(os.environ.get('JOB_WORKER_PROCESSES', 1))
+JOB_WORKER_THREADS = int(os.environ.get('JOB_WORKER_THREADS', 4))
+
+# Idle worker looks for due jobs this often, in seconds
+JOB_POLL_INTERVAL = 1
+
+# Job taken by worker which did not finish it in this many seconds is
+# considered abandoned and run again
+JOB_TIMEOUT = 60 * 10
+
+# Failed job is retried after JOB_RETRY_DELAY seconds, doubled by each
+# failure up to JOB_RETRY_MAX_DELAY, and given up after JOB_MAX_ATTEMPTS
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_DELAY = 10
+JOB_RETRY_MAX_DELAY = 60 * 60
+
+# Widths of post image variants, made in each format Pillow can write
+POST_IMAGE_WIDTHS = (480, 800, 1200)
+POST_IMAGE_FORMATS = ('avif', 'webp', 'jpeg')
+
+# Limits of images uploaded with posts, checked while upload streams in
+POST_UPLOAD_MAX_BYTES = 10 * 1024 * 1024
+POST_UPLOAD_MAX_SIDE = 8000
+POST_UPLOAD_MAX_PIXELS = 40_000_000
+POST_UPLOAD_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+
+# Subscriptions over this limit are served by join query instead of feed table
+FEED_MAX_FOLLOWS = 500
+
+# Objects in one page of API response by default and at most
+API_PAGE_SIZE = 20
+API_MAX_PAGE_SIZE = 100
+
+# Usernames and group slugs accepted by one bulk follow request
+FOLLOW_BULK_LIMIT = 500
+
+# Async views run independent queries on own threads and connections
+ASYNC_PARALLEL_QUERIES = True
@@ -0,0 +1,48 @@
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Storage of static files under content hashed names, with gzip and
+    brotli copies of text assets for nginx to send as they are.
+
+    Until collectstatic writes manifest names are not hashed, so tests
+    and development server work without collected files"""
+    compressed_extensions = ('.css', '.js', '.svg', '.json', '.map',
+                             '.txt', '.xml', '.html')
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in set(self.hashed_files.values()):
+            if name.endswith(self.compressed_extensions):
+                self.compress(name)
+
+    def compressors(self):
+        yield '.gz', lambda content: gzip.compress(content, 9, mtime=0)
+        if brotli is not None:
+            yield '.br', lambda content: brotli.compress(content, quality=11)
+
+    def compress(self, name):
+        """Save compressed copies of file next to it, if they are smaller"""
+        with self.open(name) as original:
+            content = original.read()
+        for suffix, compress in self.compressors():
+            compressed = compress(content)
+            if len(compressed) < len(content):
+                if self.exists(name + suffix):
+                    self.delete(name + suffix)
+                self._save(name + suffix, ContentFile(compressed))
@@ -18,9 +18,8 @@ from django.contrib import admin
 from django.contrib.flatpages import views
 from django.urls import path, include
 
-import debug_toolbar
-
 from Yatube import settings
+from Yatube.metrics import metrics_view
 from posts.views import server_error, page_not_found
 
 
@@ -33,8 +32,9 @@ urlpatterns = [
     path('terms/', views.flatpage, {'url': '/terms/'}, name='terms'),
     path('404/', page_not_found),
     path('500/', server_error),
-    path("__debug__/", include(debug_toolbar.urls)),
+    path('metrics/', metrics_view, name='metrics'),
 
+    path('api/', include('api.urls')),
     path('follow/', include('follows.urls')),
     path('', include('posts.urls')),
 
@@ -44,6 +44,9 @@ handler404 = "posts.views.page_not_found"
 handler500 = "posts.views.server_error"
 
 if settings.DEBUG:
+    import debug_toolbar
+
+    urlpatterns.insert(0, path("__debug__/", include(debug_toolbar.urls)))
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.STATIC_URL,
                           document_root=settings.STATIC_ROOT)
@@ -0,0 +1,75 @@
+from django.urls import reverse
+
+
+def _date(value):
+    return value.isoformat() if value is not None else None
+
+
+def _counter(name):
+    def value(user):
+        profile = getattr(user, 'profile', None)
+        return getattr(profile, name, 0)
+    return value
+
+
+class Resource:
+    """How objects of one type are put into API responses.
+
+    fields maps field names to functions of object, relations map names
+    allowed in include= to attribute of related object and its type.
+    prefetch lists lookups fields of object need"""
+    def __init__(self, type, fields, default_fields=None, relations=None,
+                 prefetch=()):
+        self.type = type
+        self.fields = fields
+        self.default_fields = default_fields or list(fields)
+        self.relations = relations or {}
+        self.prefetch = prefetch
+
+    def serialize(self, obj, fields):
+        return {name: self.fields[name](obj) for name in fields}
+
+
+USER = Resource('user', {
+    'id': lambda user: user.id,
+    'username': lambda user: user.username,
+    'first_name': lambda user: user.first_name,
+    'last_name': lambda user: user.last_name,
+    'posts_count': _counter('posts_count'),
+    'followers_count': _counter('followers_count'),
+    'following_count': _counter('following_count'),
+}, prefetch=('profile',))
+
+GROUP = Resource('group', {
+    'id': lambda group: group.id,
+    'title': lambda group: group.title,
+    'slug': lambda group: group.slug,
+    'description': lambda group: group.description,
+    'creator': lambda group: group.creator_id,
+}, relations={'creator': ('creator', 'user')})
+
+POST = Resource('post', {
+    'id': lambda post: post.id,
+    'title': lambda post: post.title,
+    'text': lambda post: post.text,
+    'slug': lambda post: post.slug,
+    'published_date': lambda post: _date(post.published_date),
+    'updated': lambda post: _date(post.updated),
+    'comments_count': lambda post: post.comments_count,
+    'author': lambda post: post.author_id,
+    'group': lambda post: post.group_id,
+    'url': lambda post: reverse('post_view',
+                                args=[post.author.username, post.slug]),
+}, relations={'author': ('author', 'user'), 'group': ('group', 'group')},
+    prefetch=('author',))
+
+COMMENT = Resource('comment', {
+    'id': lambda comment: comment.id,
+    'text': lambda comment: comment.text,
+    'published_date': lambda comment: _date(comment.published_date),
+    'author': lambda comment: comment.author_id,
+    'post': lambda comment: comment.post_id,
+}, relations={'author': ('author', 'user'), 'post': ('post', 'post')})
+
+RESOURCES = {resource.type: resource
+             for resource in (USER, GROUP, POST, COMMENT)}
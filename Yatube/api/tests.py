@@ -0,0 +1,111 @@
+import json
+
+from django.contrib.auth.models import User
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+
+from follows.models import Follow
+from jobs.worker import run_pending
+from posts.models import Comment, Group, Post
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class ApiTest(TestCase):
+    """Test API answers with sparse fields, included relations and
+    cursors in bounded number of queries"""
+    def setUp(self) -> None:
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser',
+                                             password='difficult_password')
+        self.author = User.objects.create_user(username='author',
+                                               password='difficult_password')
+        self.group = Group.objects.create(title='Группа', slug='group',
+                                          creator=self.author)
+        self.posts = [
+            Post.objects.create(author=self.author, group=self.group,
+                                title=f'Пост {i}', text='Текст',
+                                slug=f'post-{i}')
+            for i in range(5)]
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(b''.join(response.streaming_content))
+
+    def test_posts_paginated_by_cursor(self):
+        first = self.get(reverse('api_posts'), limit=3)
+        self.assertEqual([post['title'] for post in first['data']],
+                         ['Пост 4', 'Пост 3', 'Пост 2'])
+        second = self.get(reverse('api_posts'), limit=3,
+                          after=first['next'])
+        self.assertEqual([post['title'] for post in second['data']],
+                         ['Пост 1', 'Пост 0'])
+        self.assertIsNone(second['next'])
+
+    def test_sparse_fields_and_included_relations(self):
+        body = self.get(reverse('api_posts'), fields='id,author',
+                        include='author,group', **{
+                            'fields[user]': 'username,posts_count'})
+        self.assertEqual(body['data'][0],
+                         {'id': self.posts[4].id, 'author': self.author.id})
+        self.assertEqual(body['included']['user'],
+                         [{'username': 'author', 'posts_count': 5}])
+        self.assertEqual(body['included']['group'][0]['slug'], 'group')
+
+    def test_queries_do_not_grow_with_page(self):
+        url = reverse('api_posts')
+        params = {'include': 'author,group'}
+        with self.assertNumQueries(2):
+            self.get(url, limit=1, **params)
+        other = User.objects.create_user(username='other')
+        Post.objects.create(author=other, title='title', text='text',
+                            slug='slug')
+        with self.assertNumQueries(2):
+            self.get(url, limit=10, **params)
+
+    def test_unknown_fields_and_relations(self):
+        for params in ({'fields': 'password'}, {'include': 'comments'},
+                       {'include': 'author', 'fields[user]': 'email'}):
+            with self.subTest(**params):
+                response = self.client.get(reverse('api_posts'), params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+    def test_comments_with_authors(self):
+        post = self.posts[0]
+        for i in range(3):
+            Comment.objects.create(post=post, author=self.user,
+                                   text=f'Комментарий {i}')
+        body = self.get(reverse('api_comments', args=[post.id]),
+                        include='author,post')
+        self.assertEqual([comment['text'] for comment in body['data']],
+                         ['Комментарий 0', 'Комментарий 1', 'Комментарий 2'])
+        self.assertEqual(
+            [user['username'] for user in body['included']['user']],
+            ['testuser'])
+        self.assertEqual(body['included']['post'][0]['url'],
+                         reverse('post_view', args=['author', 'post-0']))
+
+    def test_unpublished_post_only_for_author(self):
+        post = self.posts[0]
+        Post.objects.filter(pk=post.pk).update(moderation=False)
+        url = reverse('api_post', args=[post.id])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.force_login(self.author)
+        self.assertEqual(self.get(url)['data']['id'], post.id)
+
+    def test_profile_and_groups(self):
+        profile = self.get(reverse('api_profile', args=['author']))
+        self.assertEqual(profile['data']['posts_count'], 5)
+        groups = self.get(reverse('api_groups'), include='creator')
+        self.assertEqual(groups['data'][0]['creator'], self.author.id)
+        self.assertEqual(groups['included']['user'][0]['username'], 'author')
+
+    def test_feed_of_follower(self):
+        self.assertEqual(self.client.get(reverse('api_feed')).status_code,
+                         401)
+        Follow.objects.create(user=self.user, author=self.author)
+        run_pending()
+        self.client.force_login(self.user)
+        body = self.get(reverse('api_feed'), fields='title')
+        self.assertEqual(len(body['data']), 5)
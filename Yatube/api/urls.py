@@ -0,0 +1,15 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path('posts/', views.PostsView.as_view(), name='api_posts'),
+    path('posts/<int:pk>/', views.PostView.as_view(), name='api_post'),
+    path('posts/<int:pk>/comments/', views.CommentsView.as_view(),
+         name='api_comments'),
+    path('groups/', views.GroupsView.as_view(), name='api_groups'),
+    path('groups/<slug:slug>/', views.GroupView.as_view(), name='api_group'),
+    path('profiles/<str:username>/', views.ProfileView.as_view(),
+         name='api_profile'),
+    path('feed/', views.FeedView.as_view(), name='api_feed'),
+]
@@ -0,0 +1,214 @@
+import json
+
+from django.conf import settings
+from django.db.models import prefetch_related_objects
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.views import View
+
+from follows.feed import follows_feed
+from posts import groups, views as pages
+from posts.models import Group, Post
+from posts.paginator import KeysetPaginator
+from Users import profiles
+from .resources import COMMENT, GROUP, POST, RESOURCES, USER
+
+
+class ApiError(Exception):
+    """Malformed API request, answered with 400 and its message"""
+
+
+class ApiView(View):
+    """Base of read only JSON API views.
+
+    Responses hold objects of resource with fields asked by fields= and
+    relations asked by include= in "included" by type, fields of those
+    are asked by fields[type]=. Relations of all objects are fetched by
+    one batched query each before response starts, so serializing
+    streamed response makes no queries"""
+    resource = None
+    http_method_names = ['get', 'head', 'options']
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except ApiError as error:
+            return JsonResponse({'error': str(error)}, status=400)
+        except Http404:
+            return JsonResponse({'error': 'Не найдено'}, status=404)
+
+    def limit(self, request):
+        """Page size asked by limit=, at most API_MAX_PAGE_SIZE"""
+        try:
+            limit = int(request.GET.get('limit', settings.API_PAGE_SIZE))
+        except ValueError:
+            raise ApiError('limit должен быть числом')
+        return max(1, min(limit, settings.API_MAX_PAGE_SIZE))
+
+    def page(self, request, queryset, keys=('published_date', 'id'),
+             descending=True):
+        paginator = KeysetPaginator(queryset, self.limit(request), keys,
+                                    descending)
+        return paginator.get_page(after=request.GET.get('after'))
+
+    def fields(self, request, resource, param):
+        value = request.GET.get(param)
+        if value is None:
+            return resource.default_fields
+        names = [name for name in value.split(',') if name]
+        unknown = [name for name in names if name not in resource.fields]
+        if unknown:
+            raise ApiError(f'Неизвестные поля {resource.type}: '
+                           f'{", ".join(unknown)}')
+        return names
+
+    def includes(self, request):
+        names = [name for name in request.GET.get('include', '').split(',')
+                 if name]
+        unknown = [name for name in names
+                   if name not in self.resource.relations]
+        if unknown:
+            raise ApiError(f'Неизвестные связи: {", ".join(unknown)}')
+        return names
+
+    def respond(self, request, data, next_cursor=None):
+        """Streamed response with object or list of objects of resource"""
+        many = isinstance(data, list)
+        objects = data if many else [data]
+        fields = self.fields(request, self.resource, 'fields')
+        includes = self.includes(request)
+        lookups = list(self.resource.prefetch)
+        for name in includes:
+            attribute, type = self.resource.relations[name]
+            lookups.append(attribute)
+            lookups += [f'{attribute}__{lookup}'
+                        for lookup in RESOURCES[type].prefetch]
+        prefetch_related_objects(objects, *lookups)
+
+        included = {}
+        for name in includes:
+            attribute, type = self.resource.relations[name]
+            related = included.setdefault(type, {})
+            for obj in objects:
+                value = getattr(obj, attribute)
+                if value is not None:
+                    related[value.pk] = value
+        included_fields = {
+            type: self.fields(request, RESOURCES[type], f'fields[{type}]')
+            for type in included}
+        return StreamingHttpResponse(
+            self.stream(objects, many, fields, included, included_fields,
+                        next_cursor),
+            content_type='application/json')
+
+    def stream(self, objects, many, fields, included, included_fields,
+               next_cursor):
+        def dump(value):
+            return json.dumps(value, ensure_ascii=False)
+
+        yield '{"data": ' + ('[' if many else '')
+        for number, obj in enumerate(objects):
+            yield ((', ' if number else '') +
+                   dump(self.resource.serialize(obj, fields)))
+        yield (']' if many else '') + ', "included": {'
+        for number, (type, related) in enumerate(included.items()):
+            resource = RESOURCES[type]
+            yield (', ' if number else '') + f'{dump(type)}: ['
+            yield ', '.join(
+                dump(resource.serialize(obj, included_fields[type]))
+                for obj in related.values())
+            yield ']'
+        yield '}'
+        if many:
+            yield f', "next": {dump(next_cursor)}'
+        yield '}'
+
+
+class PostsView(ApiView):
+    """Published posts newest first, of author and group if asked.
+
+    Author sees own unpublished posts too, as on profile page"""
+    resource = POST
+    query_budget = 4
+
+    def get(self, request):
+        posts = Post.published.select_related('author', 'group')
+        if 'author' in request.GET:
+            author = profiles.resolve(request.GET['author'])
+            posts = (pages.ProfileView().author_posts(request, author)
+                     if author else posts.none())
+        if 'group' in request.GET:
+            group = groups.resolve(request.GET['group'])
+            posts = posts.filter(group_id=group.id) if group else posts.none()
+        page = self.page(request, posts)
+        return self.respond(request, page.object_list, page.next_cursor)
+
+
+class PostView(ApiView):
+    """Post visible to user"""
+    resource = POST
+    query_budget = 4
+
+    def get(self, request, pk):
+        return self.respond(request, get_object_or_404(
+            Post.objects.visible_to(request.user).select_related(
+                'author', 'group'), pk=pk))
+
+
+class CommentsView(ApiView, pages.CommentsPage):
+    """Comments of post visible to user, oldest first"""
+    resource = COMMENT
+    query_budget = 6
+
+    def get(self, request, pk):
+        post = get_object_or_404(Post.objects.visible_to(request.user),
+                                 pk=pk)
+        self.comments_per_page = self.limit(request)
+        page = self.comments_page(request, post)
+        return self.respond(request, page.object_list, page.next_cursor)
+
+
+class GroupsView(ApiView):
+    """Moderated groups in order of creation"""
+    resource = GROUP
+    query_budget = 5
+
+    def get(self, request):
+        page = self.page(request, Group.objects.filter(moderation=True),
+                         keys=('id',), descending=False)
+        return self.respond(request, page.object_list, page.next_cursor)
+
+
+class GroupView(ApiView):
+    """Moderated group"""
+    resource = GROUP
+    query_budget = 5
+
+    def get(self, request, slug):
+        group = groups.resolve(slug)
+        if group is None:
+            raise Http404
+        return self.respond(request, get_object_or_404(
+            Group, pk=group.id, moderation=True))
+
+
+class ProfileView(ApiView):
+    """User with counters"""
+    resource = USER
+    query_budget = 3
+
+    def get(self, request, username):
+        return self.respond(request, pages.resolve_author(username))
+
+
+class FeedView(ApiView):
+    """Posts of users and groups current user follows"""
+    resource = POST
+    query_budget = 5
+
+    def get(self, request):
+        if request.user.is_anonymous:
+            return JsonResponse({'error': 'Нужно войти'}, status=401)
+        posts, keys = follows_feed(request.user)
+        page = self.page(request, posts, keys)
+        return self.respond(request, page.object_list, page.next_cursor)
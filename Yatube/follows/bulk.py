@@ -0,0 +1,101 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+
+from follows import feed
+from follows.models import Follow
+from posts.models import Group, Post
+from Users import counters
+from Users.profiles import normalize
+from Yatube.invalidation import invalidate, tag
+
+
+def follow_many(user, author_ids=(), group_ids=()):
+    """Subscribe user on authors and groups, existing subscriptions
+    are left as is.
+
+    Rows of follows made meanwhile are skipped by insert, so counters are
+    recounted instead of shifted by number of new follows"""
+    existing = Follow.objects.filter(
+        Q(author_id__in=author_ids) | Q(group_id__in=group_ids), user=user)
+    followed = set(existing.values_list('author_id', 'group_id'))
+    author_ids = [pk for pk in author_ids
+                  if (pk, None) not in followed and pk != user.id]
+    group_ids = [pk for pk in group_ids if (None, pk) not in followed]
+    Follow.objects.bulk_create(
+        [Follow(user=user, author_id=pk) for pk in author_ids] +
+        [Follow(user=user, group_id=pk) for pk in group_ids],
+        ignore_conflicts=True)
+    if author_ids or group_ids:
+        feed.backfill_many.enqueue(user.id, author_ids, group_ids)
+        counters.recount_follows([user.id, *author_ids])
+        invalidate(*(tag(Group, pk) for pk in group_ids))
+
+
+def unfollow_many(user, author_ids=(), group_ids=()):
+    """Unsubscribe user from authors and groups by one DELETE.
+
+    Rows are deleted without per row signals, feed, counters and cache
+    are updated once for all of them"""
+    follows = Follow.objects.filter(
+        Q(author_id__in=author_ids) | Q(group_id__in=group_ids), user=user)
+    rows = list(follows.values_list('pk', 'author_id', 'group_id'))
+    if not rows:
+        return
+    Follow.objects.filter(pk__in=[pk for pk, _, _ in rows])._raw_delete(
+        follows.db)
+    author_ids = [pk for _, pk, _ in rows if pk is not None]
+    group_ids = [pk for _, _, pk in rows if pk is not None]
+    feed.unfollowed_many.enqueue(user.id, author_ids, group_ids)
+    counters.recount_follows([user.id, *author_ids])
+    invalidate(*(tag(Group, pk) for pk in group_ids))
+
+
+def find_authors(usernames):
+    """Ids of users by usernames in any case, as profiles resolve them"""
+    keys = {name: normalize(name) for name in usernames}
+    found = dict(User.objects.filter(
+        profile__username_key__in=set(keys.values())).values_list(
+        'profile__username_key', 'id'))
+    found_exact = dict(User.objects.filter(
+        username__in=usernames, profile=None).values_list('username', 'id'))
+    return {name: found.get(key, found_exact.get(name))
+            for name, key in keys.items()
+            if key in found or name in found_exact}
+
+
+def apply(user, follow_authors=(), follow_groups=(), unfollow_authors=(),
+          unfollow_groups=(), follow_group_authors=()):
+    """Apply batch of subscriptions given by usernames and group slugs.
+
+    Returns new state of every known target and unknown names"""
+    usernames = {*follow_authors, *unfollow_authors}
+    slugs = {*follow_groups, *unfollow_groups}
+    authors = find_authors(usernames)
+    groups = dict(Group.objects.filter(slug__in=slugs)
+                  .values_list('slug', 'id'))
+    group_authors = dict(
+        Post.published.filter(group__slug__in=follow_group_authors)
+        .exclude(author=None).values_list('author__username', 'author_id')
+        .distinct())
+    authors.update(group_authors)
+    follow_authors = {*follow_authors, *group_authors} - set(unfollow_authors)
+    follow_groups = set(follow_groups) - set(unfollow_groups)
+    with transaction.atomic():
+        unfollow_many(user,
+                      [authors[name] for name in unfollow_authors
+                       if name in authors],
+                      [groups[slug] for slug in unfollow_groups
+                       if slug in groups])
+        follow_many(user,
+                    [authors[name] for name in follow_authors
+                     if name in authors],
+                    [groups[slug] for slug in follow_groups
+                     if slug in groups])
+    return {
+        'authors': {name: name in follow_authors and pk != user.id
+                    for name, pk in authors.items()},
+        'groups': {slug: slug in follow_groups for slug in groups},
+        'unknown': sorted((usernames - set(authors)) |
+                          (slugs - set(groups))),
+    }
@@ -0,0 +1,127 @@
+from django.conf import settings
+from django.db.models import F, Q
+
+from follows.models import Follow, FeedEntry
+from jobs.queue import task
+from posts.models import Post
+
+
+def subscribers(post):
+    """Ids of users subscribed on post's author or group"""
+    condition = Q(author_id=post.author_id)
+    if post.group_id is not None:
+        condition |= Q(group_id=post.group_id)
+    return set(Follow.objects.filter(condition, user__isnull=False)
+               .values_list('user_id', flat=True))
+
+
+def fan_out(post, created=True):
+    """Put post into feeds of all its subscribers"""
+    users = subscribers(post)
+    if not created:
+        FeedEntry.objects.filter(post=post).exclude(user_id__in=users).delete()
+    FeedEntry.objects.bulk_create(
+        [FeedEntry(user_id=user_id, post_id=post.id,
+                   published_date=post.published_date) for user_id in users],
+        ignore_conflicts=True)
+
+
+@task
+def post_changed(post_id, created):
+    """Fan out post by background job, if it still exists"""
+    post = Post.objects.filter(pk=post_id).first()
+    if post is not None:
+        fan_out(post, created)
+
+
+def backfill(follow):
+    """Put already existing posts of followed author or group into feed"""
+    if follow.group_id is not None:
+        backfill_many(follow.user_id, group_ids=[follow.group_id])
+    else:
+        backfill_many(follow.user_id, author_ids=[follow.author_id])
+
+
+@task
+def backfill_many(user_id, author_ids=(), group_ids=()):
+    """Put existing posts of several followed authors and groups into feed"""
+    posts = Post.objects.filter(Q(author_id__in=author_ids) |
+                                Q(group_id__in=group_ids))
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, post_id=post_id,
+                   published_date=published_date)
+         for post_id, published_date in posts.values_list(
+            'id', 'published_date').iterator()),
+        batch_size=1000, ignore_conflicts=True)
+
+
+def trim(follow):
+    """Remove posts of unfollowed author or group unless other follow
+    still brings them into feed"""
+    entries = FeedEntry.objects.filter(user_id=follow.user_id)
+    if follow.group_id is not None:
+        entries = entries.filter(post__group_id=follow.group_id).exclude(
+            post__author__following__user_id=follow.user_id)
+    else:
+        entries = entries.filter(post__author_id=follow.author_id).exclude(
+            post__group__following__user_id=follow.user_id)
+    entries.delete()
+
+
+@task
+def followed(follow_id):
+    """Backfill feed by background job, if follow still exists"""
+    follow = Follow.objects.filter(pk=follow_id).first()
+    if follow is not None:
+        backfill(follow)
+
+
+@task
+def unfollowed(user_id, author_id, group_id):
+    """Trim feed by background job, unless user followed again"""
+    follow = Follow(user_id=user_id, author_id=author_id, group_id=group_id)
+    if not Follow.objects.filter(user_id=user_id, author_id=author_id,
+                                 group_id=group_id).exists():
+        trim(follow)
+
+
+@task
+def unfollowed_many(user_id, author_ids=(), group_ids=()):
+    """Remove posts of several unfollowed authors and groups from feed by
+    background job, unless a follow, old or made again, still brings
+    them into it"""
+    FeedEntry.objects.filter(
+        Q(post__author_id__in=author_ids) | Q(post__group_id__in=group_ids),
+        user_id=user_id,
+    ).exclude(post__author__following__user_id=user_id).exclude(
+        post__group__following__user_id=user_id).delete()
+
+
+def rebuild(user_ids=None):
+    """Fill feeds from scratch by existing subscriptions"""
+    entries = FeedEntry.objects.all()
+    follows = Follow.objects.filter(user__isnull=False)
+    if user_ids is not None:
+        entries = entries.filter(user_id__in=user_ids)
+        follows = follows.filter(user_id__in=user_ids)
+    entries.delete()
+    for follow in follows.iterator():
+        backfill(follow)
+
+
+def follows_feed(user):
+    """Posts of all subscribed users and groups and keys to page them by.
+
+    Feed is read from precomputed entries, ordered and paged by their
+    own date and post, so index of entries serves deep pages. Users with
+    too many subscriptions are served by join query over posts"""
+    posts = Post.published.select_related('author', 'group')
+    if Follow.objects.filter(user=user).count() > settings.FEED_MAX_FOLLOWS:
+        return posts.filter(
+            Q(author__following__user=user) |
+            Q(group__following__user=user)
+        ).order_by('-published_date').distinct(), ('published_date', 'id')
+    return posts.filter(feed_entries__user=user).annotate(
+        feed_date=F('feed_entries__published_date'),
+        feed_post=F('feed_entries__post_id'),
+    ).order_by('-feed_date', '-feed_post'), ('feed_date', 'feed_post')
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from follows import feed
+
+
+class Command(BaseCommand):
+    help = 'Rebuild precomputed subscription feeds'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_ids', nargs='*', type=int,
+                            help='Rebuild feeds only for these users')
+
+    def handle(self, *args, **options):
+        feed.rebuild(options['user_ids'] or None)
+        self.stdout.write(self.style.SUCCESS('Feeds rebuilt'))
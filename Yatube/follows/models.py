@@ -1,7 +1,8 @@
 from django.contrib.auth.models import User
 from django.db import models
 
-from posts.models import Group
+from posts.models import Group, Post
+from Yatube.invalidation import InvalidatingQuerySet
 
 
 class Follow(models.Model):
@@ -16,6 +17,8 @@ class Follow(models.Model):
                                on_delete=models.CASCADE, max_length=70,
                                null=True, related_name='following')
 
+    objects = InvalidatingQuerySet.as_manager()
+
     def __str__(self):
         try:
             return self.group.title
@@ -24,4 +27,38 @@ class Follow(models.Model):
 
     class Meta:
         verbose_name = 'Подписка'
-        verbose_name_plural = 'Подписки'
\ No newline at end of file
+        verbose_name_plural = 'Подписки'
+        constraints = [
+            models.UniqueConstraint(fields=('user', 'author'),
+                                    condition=models.Q(author__isnull=False),
+                                    name='unique_author_follow'),
+            models.UniqueConstraint(fields=('user', 'group'),
+                                    condition=models.Q(group__isnull=False),
+                                    name='unique_group_follow'),
+        ]
+
+
+class FeedEntry(models.Model):
+    """Precomputed row of user's subscription feed"""
+    user = models.ForeignKey(User, verbose_name="Подписчик",
+                             on_delete=models.CASCADE,
+                             related_name='feed_entries')
+    post = models.ForeignKey(Post, verbose_name="Пост",
+                             on_delete=models.CASCADE,
+                             related_name='feed_entries')
+    published_date = models.DateTimeField("Дата публикации")
+
+    def __str__(self):
+        return f'{self.user_id}: {self.post_id}'
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(fields=('user', 'post'),
+                                    name='unique_feed_entry'),
+        ]
+        indexes = [
+            models.Index(fields=('user', '-published_date', '-post'),
+                         name='feed_entry_user_date_idx'),
+        ]
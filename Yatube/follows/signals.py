@@ -0,0 +1,32 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from follows import feed
+from follows.models import Follow
+from posts.models import Group, Post
+from Yatube import invalidation
+from Yatube.invalidation import tag
+
+invalidation.watch(Follow, lambda follow: (
+    tag(User, follow.user_id), tag(User, follow.author_id),
+    tag(Group, follow.group_id)))
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    feed.post_changed.enqueue(instance.pk, created,
+                              key=f'feed_post:{instance.pk}')
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created and instance.user_id is not None:
+        feed.followed.enqueue(instance.pk)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    if instance.user_id is not None:
+        feed.unfollowed.enqueue(instance.user_id, instance.author_id,
+                                instance.group_id)
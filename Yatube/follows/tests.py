@@ -1,9 +1,19 @@
+import json
+from unittest.mock import patch
+
 from django.contrib.auth.models import User
-from django.test import TestCase, Client
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from follows.models import Follow
+from follows.bulk import follow_many, unfollow_many
+from follows.feed import follows_feed
+from follows.models import Follow, FeedEntry
+from jobs.models import Job
+from jobs.worker import run_pending
 from posts.models import Group, Post
+from posts.paginator import KeysetPaginator
 
 
 class FollowUnfollowTest(TestCase):
@@ -50,6 +60,18 @@ class FollowUnfollowTest(TestCase):
             reverse('group', args=[self.group.slug]))
         self.assertContains(response_profile2, 'Подписаться')
 
+    def test_unknown_group_can_not_be_followed(self):
+        response = self.client.post(reverse('follow_group', args=['unknown']))
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Follow.objects.filter(user=self.user).exists())
+
+    def test_double_follow_keeps_one_subscription(self):
+        self.client.post(reverse('follow', args=[self.author.username]))
+        self.client.post(reverse('follow', args=[self.author.username]))
+        self.assertEqual(Follow.objects.filter(user=self.user).count(), 1)
+        self.client.post(reverse('unfollow', args=[self.author.username]))
+        self.assertFalse(Follow.objects.filter(user=self.user).exists())
+
     def test_not_auth_user_can_not_follow_or_unfollow(self):
         self.client.logout()
         response = self.client.get(
@@ -60,6 +82,7 @@ class FollowUnfollowTest(TestCase):
         Follow.objects.create(user=self.user, author=self.author)
         Post.objects.create(author=self.author, text='test', title='new_title',
                             slug='slug')
+        run_pending()
         response = self.client.get(
             reverse('your_follows', args=[self.user.username]))
         self.assertContains(response, 'test' and 'new_title')
@@ -71,3 +94,178 @@ class FollowUnfollowTest(TestCase):
         response = not_follower.get(
             reverse('your_follows', args=[user2.username]))
         self.assertNotContains(response, 'test' and 'new_title')
+
+
+class FeedTest(TestCase):
+    """Test precomputed feed is filled on post and follow and trimmed"""
+    def setUp(self) -> None:
+        self.client = Client()
+        self.password = 'difficult_password'
+        self.user = User.objects.create_user(username='testuser',
+                                             password=self.password)
+        self.author = User.objects.create_user(username='author_username',
+                                               password=self.password)
+        self.client.login(username='testuser', password=self.password)
+        self.group = Group.objects.create(title='test_group',
+                                          slug='test_group_slug')
+        self.old_post = Post.objects.create(author=self.author, text='old',
+                                            title='old_title', slug='old')
+
+    def feed_posts(self):
+        run_pending()
+        return set(FeedEntry.objects.filter(user=self.user)
+                   .values_list('post__slug', flat=True))
+
+    def test_follow_backfills_and_new_post_fans_out(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        self.assertEqual(self.feed_posts(), {'old'})
+        Post.objects.create(author=self.author, text='new', title='new_title',
+                            slug='new')
+        self.assertEqual(self.feed_posts(), {'old', 'new'})
+
+    def test_unfollow_keeps_posts_of_followed_group(self):
+        Post.objects.create(author=self.author, group=self.group, text='grp',
+                            title='group_title', slug='grp')
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=self.user, group=self.group)
+        Follow.objects.get(user=self.user, author=self.author).delete()
+        self.assertEqual(self.feed_posts(), {'grp'})
+
+    def test_group_change_moves_post_between_feeds(self):
+        Follow.objects.create(user=self.user, group=self.group)
+        self.old_post.group = self.group
+        self.old_post.save()
+        self.assertEqual(self.feed_posts(), {'old'})
+        self.old_post.group = None
+        self.old_post.save()
+        self.assertEqual(self.feed_posts(), set())
+
+    def test_feed_paged_by_entries(self):
+        for i in range(4):
+            Post.objects.create(author=self.author, text='text',
+                                title=f'title{i}', slug=f'slug{i}')
+        Follow.objects.create(user=self.user, author=self.author)
+        run_pending()
+        posts, keys = follows_feed(self.user)
+        paginator = KeysetPaginator(posts, 2, keys)
+        slugs, cursor = [], None
+        while True:
+            page = paginator.get_page(after=cursor)
+            slugs += [post.slug for post in page]
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        self.assertEqual(slugs, ['slug3', 'slug2', 'slug1', 'slug0', 'old'])
+
+    @override_settings(FEED_MAX_FOLLOWS=0)
+    def test_many_follows_fallback_to_join(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        FeedEntry.objects.all().delete()
+        response = self.client.get(
+            reverse('your_follows', args=[self.user.username]))
+        self.assertContains(response, 'old_title')
+
+
+class BulkFollowTest(TestCase):
+    """Test batch subscription is idempotent and keeps feed and counters"""
+    def setUp(self) -> None:
+        self.client = Client()
+        self.password = 'difficult_password'
+        self.user = User.objects.create_user(username='testuser',
+                                             password=self.password)
+        self.client.login(username='testuser', password=self.password)
+        self.authors = [User.objects.create_user(username=f'author{i}')
+                        for i in range(3)]
+        self.group = Group.objects.create(title='test_group',
+                                          slug='test_group_slug')
+        Post.objects.create(author=self.authors[0], text='test',
+                            title='title', slug='slug')
+        Post.objects.create(author=self.authors[2], group=self.group,
+                            text='test', title='group_title',
+                            slug='group_slug')
+
+    def bulk(self, **data):
+        return self.client.post(reverse('bulk_follow'), json.dumps(data),
+                                content_type='application/json').json()
+
+    def test_follow_twice_and_unfollow(self):
+        for _ in range(2):
+            state = self.bulk(follow_authors=['author0', 'author1', 'nobody'],
+                              follow_groups=['test_group_slug'])
+        self.assertEqual(state, {
+            'authors': {'author0': True, 'author1': True},
+            'groups': {'test_group_slug': True},
+            'unknown': ['nobody'],
+        })
+        self.assertEqual(Follow.objects.filter(user=self.user).count(), 3)
+        run_pending()
+        self.assertEqual(FeedEntry.objects.filter(user=self.user).count(), 2)
+        self.user.profile.refresh_from_db()
+        self.assertEqual(self.user.profile.following_count, 3)
+
+        state = self.bulk(unfollow_authors=['author0', 'author1'])
+        self.assertEqual(state['authors'],
+                         {'author0': False, 'author1': False})
+        self.assertEqual(Follow.objects.filter(user=self.user).count(), 1)
+        run_pending()
+        self.assertEqual(
+            list(FeedEntry.objects.filter(user=self.user)
+                 .values_list('post__slug', flat=True)), ['group_slug'])
+
+    def test_counters_keep_follows_made_meanwhile(self):
+        bulk_create = Follow.objects.bulk_create
+
+        def concurrent_follow(*args, **kwargs):
+            Follow.objects.create(user=self.user, author=self.authors[0])
+            return bulk_create(*args, **kwargs)
+        with patch.object(Follow.objects, 'bulk_create', concurrent_follow):
+            follow_many(self.user, [self.authors[0].id, self.authors[1].id])
+        self.user.profile.refresh_from_db()
+        self.assertEqual(self.user.profile.following_count, 2)
+        for author in self.authors[:2]:
+            author.profile.refresh_from_db()
+            self.assertEqual(author.profile.followers_count, 1)
+
+    def test_follow_all_authors_of_group(self):
+        state = self.bulk(follow_group_authors=['test_group_slug'])
+        self.assertEqual(state['authors'], {'author2': True})
+        self.assertTrue(Follow.objects.filter(
+            user=self.user, author=self.authors[2]).exists())
+
+    def test_usernames_in_any_case(self):
+        state = self.bulk(follow_authors=['AUTHOR0'])
+        self.assertEqual(state['authors'], {'AUTHOR0': True})
+        self.assertTrue(Follow.objects.filter(
+            user=self.user, author=self.authors[0]).exists())
+
+    def test_follow_nothing_new_queues_no_job(self):
+        follow_many(self.user, [self.authors[0].id])
+        run_pending()
+        follow_many(self.user, [self.authors[0].id])
+        self.assertFalse(Job.objects.exists())
+
+    def test_unfollow_many_without_signals(self):
+        author_ids = [author.id for author in self.authors]
+        follow_many(self.user, author_ids, [self.group.id])
+        run_pending()
+        with CaptureQueriesContext(connection) as queries:
+            unfollow_many(self.user, author_ids[:1])
+        with self.assertNumQueries(len(queries)):
+            unfollow_many(self.user, author_ids[1:], [self.group.id])
+        self.assertEqual(Job.objects.count(), 2)
+        run_pending()
+        self.assertFalse(FeedEntry.objects.filter(user=self.user).exists())
+        self.user.profile.refresh_from_db()
+        self.assertEqual(self.user.profile.following_count, 0)
+        self.authors[2].profile.refresh_from_db()
+        self.assertEqual(self.authors[2].profile.followers_count, 0)
+
+    def test_form_data_and_limit(self):
+        response = self.client.post(reverse('bulk_follow'),
+                                    {'follow_authors': ['author1']})
+        self.assertEqual(response.json()['authors'], {'author1': True})
+        with self.settings(FOLLOW_BULK_LIMIT=1):
+            response = self.client.post(
+                reverse('bulk_follow'),
+                {'follow_authors': ['author1', 'author2']})
+        self.assertEqual(response.status_code, 400)
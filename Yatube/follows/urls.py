@@ -3,6 +3,7 @@ from django.urls import path
 from follows import views
 
 urlpatterns = [
+    path('bulk/', views.BulkFollowView.as_view(), name='bulk_follow'),
     path('<str:username>/', views.FollowsView.as_view(),
          name='your_follows'),
     path('<str:username>/follow/', views.FollowView.as_view(), name='follow'),
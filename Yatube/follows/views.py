@@ -1,47 +1,89 @@
-from django.contrib.auth.models import User
-from django.db.models import Q
-from django.shortcuts import render, redirect
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, JsonResponse
+from django.shortcuts import redirect
+from django.utils.decorators import method_decorator
 from django.views import View
 
+from follows import bulk
+from follows.feed import follows_feed
 from follows.models import Follow
-from posts.models import Post, Group
-from posts.views import PaginatePage
+from posts import groups
+from posts.views import PaginatePage, resolve_author
+from Yatube.aio import AsyncView, render_async
 
 
-class FollowsView(View, PaginatePage):
+class FollowsView(AsyncView, PaginatePage):
     """Posts output of all subscribed users and groups"""
-    def get(self, request, username):
-        posts = Post.objects.select_related('author', 'group').filter(
-            Q(author__following__user=request.user) |
-            Q(group__following__user=request.user)
-        ).order_by('-published_date').distinct()
-        paginator, page = self.paginate(request, posts)
-        return render(request, 'index.html',
-                      {'page': page, 'paginator': paginator})
+    query_budget = 5
+
+    async def get(self, request, username):
+        paginator, page = await sync_to_async(
+            lambda: self.paginate(request, *follows_feed(request.user)))()
+        return await render_async(request, 'index.html',
+                                  {'page': page, 'paginator': paginator})
+
+
+def resolve_group(slug):
+    """Id of group with slug, 404 if there is none"""
+    ref = groups.resolve(slug)
+    if ref is None:
+        raise Http404
+    return ref.id
 
 
 class FollowView(View):
     """Subscribe on group or user"""
     def post(self, request, username=None, group_slug=None):
         if group_slug is not None:
-            Follow.objects.create(user=request.user,
-                                  group=Group.objects.get(slug=group_slug))
+            Follow.objects.get_or_create(user=request.user,
+                                         group_id=resolve_group(group_slug))
             return redirect('group', group_slug)
         elif username is not None:
-            Follow.objects.create(user=request.user,
-                                  author=User.objects.get(username=username))
-            return redirect('profile', username)
+            author = resolve_author(username)
+            Follow.objects.get_or_create(user=request.user, author=author)
+            return redirect('profile', author.username)
 
 
 class UnfollowView(View):
     """Unsubscribe on group or user"""
     def post(self, request, username=None, group_slug=None):
         if group_slug is not None:
-            Follow.objects.get(user=request.user,
-                               group__slug=group_slug).delete()
+            Follow.objects.filter(user=request.user,
+                                  group_id=resolve_group(group_slug)).delete()
             return redirect('group', group_slug)
         elif username is not None:
-            Follow.objects.get(user=request.user,
-                               author__username=username).delete()
-            return redirect('profile', username)
+            author = resolve_author(username)
+            Follow.objects.filter(user=request.user,
+                                  author_id=author.pk).delete()
+            return redirect('profile', author.username)
+
+
+@method_decorator(login_required, name='dispatch')
+class BulkFollowView(View):
+    """Subscribe and unsubscribe on many users and groups at once.
+
+    Takes JSON object or form with lists of usernames and group slugs,
+    answers with new subscription state of them"""
+    fields = ('follow_authors', 'follow_groups', 'unfollow_authors',
+              'unfollow_groups', 'follow_group_authors')
+
+    def post(self, request):
+        if request.content_type == 'application/json':
+            try:
+                data = json.loads(request.body)
+                targets = {field: [str(name) for name in data.get(field, [])]
+                           for field in self.fields}
+            except (ValueError, TypeError, AttributeError):
+                return JsonResponse({'error': 'Неверный JSON'}, status=400)
+        else:
+            targets = {field: request.POST.getlist(field)
+                       for field in self.fields}
+        if sum(map(len, targets.values())) > settings.FOLLOW_BULK_LIMIT:
+            return JsonResponse({'error': 'Слишком много подписок'},
+                                status=400)
+        return JsonResponse(bulk.apply(request.user, **targets))
 
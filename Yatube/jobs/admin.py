@@ -0,0 +1,22 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from jobs.models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """Class for proper look and work with Job model"""
+    list_display = ('name', 'status', 'attempts', 'run_at', 'created')
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'key')
+    readonly_fields = ('name', 'args', 'key', 'attempts', 'locked_until',
+                       'error', 'created')
+    actions = ['retry']
+
+    def retry(self, request, queryset):
+        queryset.filter(status=Job.FAILED).update(
+            status=Job.QUEUED, attempts=0, run_at=timezone.now())
+
+    retry.short_description = 'Запустить снова'
+    retry.allowed_permissions = ('change',)
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from jobs import worker
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs from the queue till SIGTERM or SIGINT'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int,
+                            default=settings.JOB_WORKER_PROCESSES,
+                            help='Worker processes')
+        parser.add_argument('--threads', type=int,
+                            default=settings.JOB_WORKER_THREADS,
+                            help='Threads running jobs in each process')
+        parser.add_argument('--burst', action='store_true',
+                            help='Exit once no job is due')
+
+    def handle(self, *args, **options):
+        worker.serve(options['processes'], options['threads'],
+                     options['burst'])
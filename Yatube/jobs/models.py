@@ -0,0 +1,41 @@
+from django.db import models
+from django.db.models import Q
+
+
+class Job(models.Model):
+    """Call of background task waiting in queue, running or failed.
+
+    Done jobs are deleted. Queued job with the same key as another
+    queued one is not added, so repeated requests of the same work
+    before it starts run it once"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUSES = ((QUEUED, 'В очереди'), (RUNNING, 'Выполняется'),
+                (FAILED, 'Не выполнено'))
+
+    name = models.CharField('Задача', max_length=200)
+    args = models.JSONField('Аргументы', default=list)
+    key = models.CharField('Ключ', max_length=200, blank=True, null=True)
+    status = models.CharField('Состояние', max_length=7, choices=STATUSES,
+                              default=QUEUED)
+    attempts = models.PositiveIntegerField('Попыток', default=0)
+    run_at = models.DateTimeField('Запуск не раньше')
+    locked_until = models.DateTimeField('Занята до', blank=True, null=True)
+    error = models.TextField('Ошибка', blank=True)
+    created = models.DateTimeField('Создана', auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        indexes = [
+            models.Index(fields=('status', 'run_at'), name='job_due_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=('key',),
+                                    condition=Q(status='queued'),
+                                    name='job_queued_key_unique'),
+        ]
@@ -0,0 +1,42 @@
+from datetime import timedelta
+from functools import partial
+
+from django.utils import timezone
+
+from .models import Job
+
+_tasks = {}
+
+
+def task_name(function):
+    return f'{function.__module__}.{function.__qualname__}'
+
+
+def task(function):
+    """Register function as background task.
+
+    Function stays callable as is, function.enqueue(*args, key=None,
+    delay=0) puts its call into queue. Arguments have to be JSON
+    serializable and the function safe to run more than once, as failed
+    jobs are retried"""
+    name = task_name(function)
+    _tasks[name] = function
+    function.enqueue = partial(enqueue, name)
+    return function
+
+
+def get_task(name):
+    """Function of registered task, None if there is none"""
+    return _tasks.get(name)
+
+
+def enqueue(name, *args, key=None, delay=0):
+    """Queue call of task by name with args.
+
+    Job is saved in the current transaction, so it runs only if the
+    write it follows is committed. Job with key is skipped while
+    another one with the same key is queued"""
+    Job.objects.bulk_create(
+        [Job(name=name, args=list(args), key=key,
+             run_at=timezone.now() + timedelta(seconds=delay))],
+        ignore_conflicts=key is not None)
@@ -0,0 +1,82 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from jobs.models import Job
+from jobs.queue import task
+from jobs.worker import run_pending
+
+calls = []
+
+
+@task
+def record(value):
+    calls.append(value)
+
+
+@task
+def fail():
+    raise ValueError('fail')
+
+
+@override_settings(JOB_MAX_ATTEMPTS=2)
+class JobQueueTest(TestCase):
+    """Test jobs are queued once by key, run by worker and retried with
+    backoff when they fail"""
+    def setUp(self) -> None:
+        calls.clear()
+
+    def test_job_runs_and_is_deleted(self):
+        record.enqueue(1)
+        record.enqueue(2)
+        self.assertEqual(run_pending(), 2)
+        self.assertEqual(calls, [1, 2])
+        self.assertFalse(Job.objects.exists())
+
+    def test_key_queues_job_once(self):
+        record.enqueue(1, key='record')
+        record.enqueue(2, key='record')
+        self.assertEqual(Job.objects.count(), 1)
+        run_pending()
+        self.assertEqual(calls, [1])
+        record.enqueue(3, key='record')
+        run_pending()
+        self.assertEqual(calls, [1, 3])
+
+    def test_delayed_job_waits(self):
+        record.enqueue(1, delay=60)
+        self.assertEqual(run_pending(), 0)
+        self.assertEqual(calls, [])
+
+    def test_failed_job_retried_then_given_up(self):
+        fail.enqueue()
+        run_pending()
+        job = Job.objects.get()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertEqual(job.attempts, 1)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('ValueError', job.error)
+        Job.objects.update(run_at=timezone.now())
+        run_pending()
+        job = Job.objects.get()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+        self.assertEqual(run_pending(), 0)
+
+    def test_unknown_task_fails(self):
+        Job.objects.create(name='jobs.tests.missing', run_at=timezone.now(),
+                           attempts=1)
+        run_pending()
+        self.assertEqual(Job.objects.get().status, Job.FAILED)
+
+    def test_abandoned_job_run_again(self):
+        record.enqueue(1)
+        Job.objects.update(status=Job.RUNNING, attempts=1,
+                           locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(calls, [1])
+        record.enqueue(2)
+        Job.objects.update(status=Job.RUNNING, attempts=1,
+                           locked_until=timezone.now() + timedelta(minutes=1))
+        self.assertEqual(run_pending(), 0)
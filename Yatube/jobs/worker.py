@@ -0,0 +1,144 @@
+import logging
+import multiprocessing
+import random
+import signal
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import (IntegrityError, close_old_connections, connections,
+                       transaction)
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+from .queue import get_task
+
+logger = logging.getLogger(__name__)
+
+# Due jobs tried by one claim, others may be taken by concurrent workers
+CLAIM_BATCH = 10
+
+
+def _due(now):
+    """Queued jobs due to run and running ones whose worker is gone"""
+    return (Q(status=Job.QUEUED, run_at__lte=now) |
+            Q(status=Job.RUNNING, locked_until__lt=now))
+
+
+def claim():
+    """Take next due job for this worker, None if there is none.
+
+    Job is taken by conditional UPDATE, so concurrent workers never take
+    the same one, and is held for JOB_TIMEOUT seconds"""
+    now = timezone.now()
+    candidates = list(Job.objects.filter(_due(now)).order_by(
+        'run_at').values_list('pk', flat=True)[:CLAIM_BATCH])
+    for pk in candidates:
+        taken = Job.objects.filter(_due(now), pk=pk).update(
+            status=Job.RUNNING, attempts=F('attempts') + 1,
+            locked_until=now + timedelta(seconds=settings.JOB_TIMEOUT))
+        if taken:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def backoff(attempts):
+    """Seconds before retry after attempts failed, doubled by each one
+    up to JOB_RETRY_MAX_DELAY and spread so retries do not bunch"""
+    delay = min(settings.JOB_RETRY_DELAY * 2 ** (attempts - 1),
+                settings.JOB_RETRY_MAX_DELAY)
+    return delay * random.uniform(0.5, 1)
+
+
+def execute(job):
+    """Run claimed job, delete it when done, queue it again with backoff
+    or mark failed after JOB_MAX_ATTEMPTS when it raises"""
+    function = get_task(job.name)
+    try:
+        if function is None:
+            raise LookupError(f'Unknown task {job.name}')
+        function(*job.args)
+    except Exception:
+        logger.exception('Job %s %s failed, attempt %s', job.pk, job.name,
+                         job.attempts)
+        error = traceback.format_exc()
+        jobs = Job.objects.filter(pk=job.pk)
+        if job.attempts >= settings.JOB_MAX_ATTEMPTS:
+            jobs.update(status=Job.FAILED, locked_until=None, error=error)
+            return
+        try:
+            with transaction.atomic():
+                jobs.update(status=Job.QUEUED, locked_until=None,
+                            error=error, run_at=timezone.now() + timedelta(
+                                seconds=backoff(job.attempts)))
+        except IntegrityError:
+            # Job with the same key was queued meanwhile and will do it
+            jobs.delete()
+    else:
+        Job.objects.filter(pk=job.pk).delete()
+
+
+def work(stop, burst=False):
+    """Run jobs one by one till stop is set, or till none is due in burst
+    mode. Returns number of jobs run"""
+    count = 0
+    own_thread = threading.current_thread() is not threading.main_thread()
+    try:
+        while not stop.is_set():
+            if own_thread:
+                close_old_connections()
+            job = claim()
+            if job is None:
+                if burst:
+                    break
+                stop.wait(settings.JOB_POLL_INTERVAL)
+                continue
+            execute(job)
+            count += 1
+    finally:
+        if own_thread:
+            connections.close_all()
+    return count
+
+
+def run_pending():
+    """Run every due job in this thread"""
+    return work(threading.Event(), burst=True)
+
+
+def _process(threads, burst):
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *args: stop.set())
+    workers = [threading.Thread(target=work, args=(stop, burst),
+                                name=f'jobs-{number}')
+               for number in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+def serve(processes, threads, burst=False):
+    """Run jobs by threads in each of processes till SIGTERM or SIGINT.
+
+    Running jobs are finished before exit"""
+    if processes <= 1:
+        return _process(threads, burst)
+    connections.close_all()
+    children = [multiprocessing.Process(target=_process,
+                                        args=(threads, burst))
+                for _ in range(processes)]
+    for child in children:
+        child.start()
+
+    def stop(*args):
+        for child in children:
+            if child.is_alive():
+                child.terminate()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, stop)
+    for child in children:
+        child.join()
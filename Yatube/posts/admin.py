@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from .models import Post, Group, Comment
+from .models import Post, PostRedirect, Group, Comment, ImageVariant
+from .search import is_full_text, search_posts
 
 
 class ActionsAdmin(admin.ModelAdmin):
@@ -24,14 +25,43 @@ class PostsInline(admin.StackedInline):
     extra = 1
 
 
+class ImageVariantsInline(admin.TabularInline):
+    """Show variants made of post image"""
+    model = ImageVariant
+    fields = ('format', 'width', 'height', 'size', 'file')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+class PostRedirectsInline(admin.TabularInline):
+    """Show former addresses redirected to post"""
+    model = PostRedirect
+    fields = ('author', 'slug')
+    extra = 0
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Post)
 class PostAdmin(ActionsAdmin):
     """Class for proper look and work with Post model"""
     list_display = ('title', 'author', 'group', 'published_date', 'moderation')
     list_filter = ('author', 'group', 'published_date', 'moderation')
-    search_fields = ('title', 'author', 'group')
+    search_fields = ('title', 'author__username', 'group__title')
     list_editable = ('moderation', 'author')
     actions = ['unpublish', 'publish']
+    inlines = [ImageVariantsInline, PostRedirectsInline]
+
+    def get_search_results(self, request, queryset, search_term):
+        if search_term and is_full_text(queryset):
+            posts, _ = search_posts(queryset, search_term)
+            return posts, False
+        return super().get_search_results(request, queryset, search_term)
 
 
 @admin.register(Group)
@@ -0,0 +1,271 @@
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.contrib.auth import (BACKEND_SESSION_KEY, HASH_SESSION_KEY,
+                                 SESSION_KEY)
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.db import connection
+from django.test import Client, override_settings
+from django.utils.crypto import get_random_string
+
+from follows import feed
+from follows.models import Follow
+from posts import groups as group_slugs
+from posts.models import Comment, Group, Post
+from Users import counters
+from Yatube import metrics
+
+MIX_FILE = os.path.join(settings.BASE_DIR, 'benchmarks', 'mix.jsonl')
+
+
+@contextmanager
+def own_cache():
+    """Run with a file cache of its own, removed afterwards, so seeded
+    database and the real one never read each other's entries cached by
+    ids and paths"""
+    location = tempfile.mkdtemp(prefix='yatube_benchmark_cache_')
+    backend = 'django.core.cache.backends.filebased.FileBasedCache'
+    try:
+        with override_settings(CACHES={'default': {'BACKEND': backend,
+                                                   'LOCATION': location}}):
+            group_slugs.clear()
+            yield
+    finally:
+        group_slugs.clear()
+        shutil.rmtree(location, ignore_errors=True)
+
+
+def seed(users=50, groups=5, posts=1000, comments=2000, follows=200):
+    """Fill database with synthetic data by bulk inserts"""
+    password = make_password('benchmark')
+    User.objects.bulk_create(
+        User(username=f'bench_user{i}', password=password)
+        for i in range(users))
+    users = list(User.objects.filter(username__startswith='bench_user'))
+    Group.objects.bulk_create(
+        Group(title=f'Группа {i}', slug=f'bench_group{i}',
+              description='Группа для нагрузочного теста')
+        for i in range(groups))
+    groups = list(Group.objects.filter(slug__startswith='bench_group'))
+    Post.objects.bulk_create(
+        (Post(author=random.choice(users), group=random.choice(groups),
+              title=f'Пост {i}', text='Текст поста ' * 20,
+              slug=f'bench-post-{i}') for i in range(posts)),
+        batch_size=1000)
+    posts = list(Post.objects.filter(slug__startswith='bench-post-')
+                 .values_list('id', flat=True))
+    Comment.objects.bulk_create(
+        (Comment(post_id=random.choice(posts), author=random.choice(users),
+                 text='Комментарий') for _ in range(comments)),
+        batch_size=1000)
+    pairs = set()
+    while len(pairs) < min(follows, len(users) * (len(users) - 1)):
+        user, author = random.sample(users, 2)
+        pairs.add((user.id, author.id))
+    Follow.objects.bulk_create(
+        Follow(user_id=user_id, author_id=author_id)
+        for user_id, author_id in pairs)
+    Follow.objects.bulk_create(
+        Follow(user=user, group=random.choice(groups)) for user in users)
+    feed.rebuild()
+    counters.rebuild()
+
+
+def load_mix(path=MIX_FILE):
+    with open(path) as mix:
+        return [json.loads(line) for line in mix if line.strip()]
+
+
+class Traffic:
+    """Random requests of the mix with paths filled from seeded data"""
+    def __init__(self, mix):
+        self.mix = mix
+        self.weights = [item.get('weight', 1) for item in mix]
+        self.users = list(User.objects.filter(
+            username__startswith='bench_user').values_list('username',
+                                                           flat=True))
+        self.groups = list(Group.objects.filter(
+            slug__startswith='bench_group').values_list('slug', flat=True))
+        self.posts = list(Post.objects.filter(
+            slug__startswith='bench-post-').values_list(
+            'author__username', 'slug'))
+
+    def next(self, username):
+        item = random.choices(self.mix, self.weights)[0]
+        author, post = random.choice(self.posts)
+        path = item['path'].format(user=username, author=author, post=post,
+                                   group=random.choice(self.groups))
+        return item, path
+
+
+def session_cookie(user):
+    """Session of logged in user without going through login form"""
+    session = SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.create()
+    return session.session_key
+
+
+def percentile(values, part):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * part))]
+
+
+def report(samples, seconds, mode, workers=1):
+    """Latency percentiles, throughput and queries per request"""
+    results = {}
+    for name in sorted({sample[0] for sample in samples}):
+        latencies = [sample[1] * 1000 for sample in samples
+                     if sample[0] == name]
+        queries = [sample[2] for sample in samples
+                   if sample[0] == name and sample[2] is not None]
+        results[name] = {
+            'requests': len(latencies),
+            'p50_ms': round(percentile(latencies, 0.5), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'p99_ms': round(percentile(latencies, 0.99), 2),
+            'queries': (round(sum(queries) / len(queries), 2)
+                        if queries else None),
+        }
+    return {'mode': mode, 'requests': len(samples),
+            'throughput_rps': round(len(samples) / seconds, 2),
+            'worker_rps': round(len(samples) / seconds / workers, 2),
+            'results': results}
+
+
+def run_inprocess(requests=500, mix=None):
+    """Replay traffic against WSGI handler in this process"""
+    traffic = Traffic(mix or load_mix())
+    clients = {}
+    for user in User.objects.filter(username__in=traffic.users[:10]):
+        client = Client()
+        client.force_login(user)
+        clients[user.username] = client
+    anonymous = Client()
+    samples = []
+    started = time.perf_counter()
+    for _ in range(requests):
+        username = random.choice(list(clients))
+        item, path = traffic.next(username)
+        client = clients[username] if item.get('auth') else anonymous
+        # Counted by metrics of request, with queries of its other threads
+        queries = metrics.total('db_queries')
+        start = time.perf_counter()
+        if item.get('method', 'GET') == 'POST':
+            client.post(path, item.get('data', {}))
+        else:
+            client.get(path)
+        latency = time.perf_counter() - start
+        samples.append((item['name'], latency,
+                        metrics.total('db_queries') - queries))
+    return report(samples, time.perf_counter() - started, 'inprocess')
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def run_gunicorn(requests=500, workers=2, concurrency=8, mix=None,
+                 asgi=False):
+    """Replay traffic over HTTP against gunicorn serving the same database,
+    by sync WSGI workers or by uvicorn workers of ASGI application"""
+    traffic = Traffic(mix or load_mix())
+    port = _free_port()
+    cache = settings.CACHES['default']
+    env = dict(os.environ, DB_NAME=str(connection.settings_dict['NAME']),
+               CACHE_BACKEND=cache['BACKEND'],
+               CACHE_LOCATION=cache['LOCATION'])
+    command = [sys.executable, '-m', 'gunicorn', '--workers', str(workers),
+               '--bind', f'127.0.0.1:{port}']
+    if asgi:
+        command += ['--worker-class', 'uvicorn.workers.UvicornWorker',
+                    'Yatube.asgi:application']
+    else:
+        command.append('Yatube.wsgi:application')
+    server = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env)
+    try:
+        _wait_for_port(port)
+        users = list(User.objects.filter(username__in=traffic.users[:10]))
+        sessions = {user.username: session_cookie(user) for user in users}
+
+        def send(_):
+            username = random.choice(users).username
+            item, path = traffic.next(username)
+            csrf = get_random_string(32)
+            headers = {'X-CSRFToken': csrf}
+            cookies = f'csrftoken={csrf}'
+            if item.get('auth'):
+                cookies += f'; sessionid={sessions[username]}'
+            headers['Cookie'] = cookies
+            data = None
+            if item.get('method', 'GET') == 'POST':
+                data = urlencode(item.get('data', {})).encode()
+            request = Request(f'http://127.0.0.1:{port}{path}', data=data,
+                              headers=headers)
+            start = time.perf_counter()
+            try:
+                urlopen(request).read()
+            except HTTPError:
+                pass
+            return item['name'], time.perf_counter() - start, None
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            samples = list(executor.map(send, range(requests)))
+        return report(samples, time.perf_counter() - started,
+                      f'{"asgi" if asgi else "wsgi"} x{workers}', workers)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def _wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), 1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'gunicorn did not start on port {port}')
+
+
+def compare(result, baseline, tolerance=0.25):
+    """Regressions of result against stored baseline, which may be of
+    another mode, e.g. ASGI run against WSGI baseline"""
+    regressions = []
+    previous_rps = baseline.get('worker_rps')
+    if previous_rps and result['worker_rps'] < previous_rps / (1 + tolerance):
+        regressions.append(f'throughput per worker: {previous_rps} -> '
+                           f'{result["worker_rps"]} rps')
+    for name, current in result['results'].items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            continue
+        if (current['queries'] is not None and previous['queries'] is not None
+                and current['queries'] > previous['queries']):
+            regressions.append(f'{name}: queries {previous["queries"]} -> '
+                               f'{current["queries"]}')
+        if current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append(f'{name}: p95 {previous["p95_ms"]}ms -> '
+                               f'{current["p95_ms"]}ms')
+    return regressions
@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
+from django.template.loader import render_to_string
+
+from Yatube.caching import get_or_compute
+from Yatube.invalidation import depend, tag
+from .models import Group, Post
+from .thumbnails import FORMATS
+
+
+def render_card(post):
+    """User independent part of post card, cached till post, its author
+    or group change"""
+    def compute():
+        depend(tag(Post, post.id), tag(User, post.author_id),
+               tag(Group, post.group_id))
+        return render_to_string('include/post_card.html', {'post': post})
+    return get_or_compute(f'post_card:{post.id}', compute,
+                          settings.POST_CARD_CACHE_TIMEOUT)
+
+
+def render_image(post):
+    """Picture of post image variants with srcset per format, or
+    placeholder while they are being made. Cached till post changes.
+
+    Variants are queried for the post alone unless prefetched"""
+    if not post.image:
+        return ''
+
+    def compute():
+        depend(tag(Post, post.id))
+        variants = {}
+        for variant in post.image_variants.all():
+            variants.setdefault(variant.format, []).append(variant)
+        sources = [{'type': FORMATS[name][1], 'variants': variants[name]}
+                   for name in FORMATS if name in variants]
+        return render_to_string('include/post_image.html', {
+            'sources': sources[:-1] if 'jpeg' in variants else sources,
+            'fallback': sources[-1] if sources else None})
+    return get_or_compute(f'post_image:{post.id}', compute,
+                          settings.POST_CARD_CACHE_TIMEOUT)
+
+
+def prefetch_images(posts):
+    """Fetch variants of image posts whose card and picture are not
+    cached by one query, so rendering page of cards makes no more"""
+    posts = [post for post in posts if post.image]
+    keys = {post.id: (f'post_card:{post.id}', f'post_image:{post.id}')
+            for post in posts}
+    cached = cache.get_many([key for pair in keys.values() for key in pair])
+    missing = [post for post in posts
+               if not any(key in cached for key in keys[post.id])]
+    prefetch_related_objects(missing, 'image_variants')
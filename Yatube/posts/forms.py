@@ -1,6 +1,7 @@
 from django import forms
 
 from .models import Post, Comment
+from .uploads import UploadedImageField
 
 
 class PostForm(forms.ModelForm):
@@ -8,13 +9,27 @@ class PostForm(forms.ModelForm):
     class Meta:
         model = Post
         fields = ('group', 'title', 'text', 'image', 'slug')
+        field_classes = {'image': UploadedImageField}
 
+    def clean_slug(self):
+        slug = self.cleaned_data['slug']
+        posts = Post.objects.filter(author_id=self.instance.author_id,
+                                    slug=slug)
+        if posts.exclude(pk=self.instance.pk).exists():
+            raise forms.ValidationError('У вас уже есть запись с таким url')
+        return slug
 
-class PostEditForm(forms.ModelForm):
-    """Post edit form"""
-    class Meta:
-        model = Post
-        fields = ('group', 'title', 'text', 'image')
+
+class PostEditForm(PostForm):
+    """Post edit form, slug is kept unless new one is given"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['slug'].required = False
+
+    def clean_slug(self):
+        if not self.cleaned_data['slug']:
+            return self.instance.slug
+        return super().clean_slug()
 
 
 class AddCommentForm(forms.ModelForm):
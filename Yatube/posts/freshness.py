@@ -0,0 +1,91 @@
+import hashlib
+from datetime import datetime, timezone
+
+from django.contrib.auth.models import User
+from django.db.models import Count, Exists, Max, OuterRef, Subquery
+
+from follows.models import Follow
+from Yatube.invalidation import invalidated_at, list_tag, tag
+from .models import Comment, Group, Post
+
+
+def _summary(queryset, by, aggregate):
+    return Subquery(queryset.order_by().values(by).annotate(
+        value=aggregate).values('value'))
+
+
+def _version(request, row, *dates):
+    """ETag of user's view of row and latest of dates"""
+    if row is None:
+        return None, None
+    etag = hashlib.md5(repr((request.user.pk, *row)).encode()).hexdigest()
+    return etag, max((date for date in dates if date), default=None)
+
+
+def _changed(*tags):
+    """Time of latest invalidation of tags, kept without a query"""
+    return datetime.fromtimestamp(invalidated_at(tags), timezone.utc)
+
+
+def main_page_version(request):
+    """Version of all posts is time of latest change of any post, group or
+    user"""
+    changed = _changed(list_tag(Post), list_tag(Group), list_tag(User))
+    return _version(request, (changed,), changed)
+
+
+def group_version(request, group_slug):
+    """Version of group page, its own columns changed with group tag,
+    names of authors of its posts with any user"""
+    posts = Post.published.filter(group=OuterRef('pk'))
+    row = Group.objects.filter(slug=group_slug, moderation=True).annotate(
+        last=_summary(posts, 'group', Max('updated')),
+        count=_summary(posts, 'group', Count('id')),
+        followers=_summary(Follow.objects.filter(group=OuterRef('pk')),
+                           'group', Count('id')),
+        followed=Exists(Follow.objects.filter(user=request.user,
+                                              group=OuterRef('pk'))),
+    ).values_list('id', 'last', 'count', 'followers', 'followed').first()
+    if row is None:
+        return None, None
+    changed = _changed(tag(Group, row[0]), list_tag(User))
+    return _version(request, (*row, changed), row[1], changed)
+
+
+def profile_version(request, username):
+    """Version of profile page, name of author changed with user tag"""
+    posts = (Post.objects if request.user.username == username
+             else Post.published).filter(author=OuterRef('pk'))
+    row = User.objects.filter(username=username).annotate(
+        last=_summary(posts, 'author', Max('updated')),
+        count=_summary(posts, 'author', Count('id')),
+        followed=Exists(Follow.objects.filter(user=request.user,
+                                              author=OuterRef('pk'))),
+    ).values_list('id', 'last', 'count', 'followed',
+                  'profile__followers_count', 'profile__following_count',
+                  'profile__posts_count').first()
+    if row is None:
+        return None, None
+    changed = _changed(tag(User, row[0]))
+    return _version(request, (*row, changed), row[1], changed)
+
+
+def post_version(request, username, post_slug):
+    """Version of post page, names of author and group changed with their
+    tags, names of authors of comments with any user"""
+    comments = Comment.objects.filter(post=OuterRef('pk'))
+    row = Post.objects.visible_to(request.user).filter(
+        author__username=username, slug=post_slug).annotate(
+        last_comment=_summary(comments, 'post', Max('published_date')),
+        followed=Exists(Follow.objects.filter(user=request.user,
+                                              author=OuterRef('author'))),
+    ).values_list('author_id', 'group_id', 'updated', 'last_comment',
+                  'comments_count', 'followed',
+                  'author__profile__followers_count',
+                  'author__profile__following_count',
+                  'author__profile__posts_count').first()
+    if row is None:
+        return None, None
+    changed = _changed(tag(User, row[0]), tag(Group, row[1]),
+                       list_tag(User))
+    return _version(request, (*row, changed), row[2], row[3], changed)
@@ -0,0 +1,62 @@
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+
+from Yatube import invalidation
+from Yatube.invalidation import invalidated_at, list_tag
+from .models import Group
+
+GroupRef = namedtuple('GroupRef', 'id title moderation')
+
+_groups = {}
+_lock = threading.Lock()
+_loaded_at = time.time()
+_checked_at = 0.0
+
+
+def clear():
+    """Forget every group resolved by this process"""
+    global _loaded_at
+    with _lock:
+        _groups.clear()
+        _loaded_at = time.time()
+
+
+def _check():
+    """Clear groups if any group was changed by another process since
+    they were loaded. Shared invalidation time is asked at most once per
+    GROUP_SLUG_CHECK_INTERVAL"""
+    global _checked_at
+    now = time.monotonic()
+    if now - _checked_at < settings.GROUP_SLUG_CHECK_INTERVAL:
+        return
+    _checked_at = now
+    if invalidated_at([list_tag(Group)]) > _loaded_at:
+        clear()
+
+
+def resolve(slug):
+    """GroupRef of group with slug, None if there is no such group.
+
+    Groups are kept in memory of process. They are forgotten as soon as
+    any group changes in this process and within
+    GROUP_SLUG_CHECK_INTERVAL seconds of change in another one. Unknown
+    slugs are not remembered, so new group is found at once"""
+    _check()
+    ref = _groups.get(slug)
+    if ref is None:
+        loaded_at = _loaded_at
+        row = Group.objects.filter(slug=slug).values_list(
+            'id', 'title', 'moderation').first()
+        if row is None:
+            return None
+        ref = GroupRef(*row)
+        with _lock:
+            if loaded_at == _loaded_at:
+                _groups[slug] = ref
+    return ref
+
+
+invalidation.on_invalidate(list_tag(Group), clear)
@@ -0,0 +1,12 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.db import models
+
+
+class SearchIndex(GinIndex):
+    """GIN index on Postgres, plain index on databases without GIN"""
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor != 'postgresql':
+            return models.Index.create_sql(self, model, schema_editor,
+                                           using=using, **kwargs)
+        return super().create_sql(model, schema_editor, using=using,
+                                  **kwargs)
@@ -0,0 +1,69 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = ('Seed a throwaway test database and replay request mix '
+            'in process or against gunicorn WSGI or ASGI workers, with '
+            'a file cache of its own')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mix', default=benchmark.MIX_FILE,
+                            help='JSON lines file with request mix')
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--groups', type=int, default=5)
+        parser.add_argument('--posts', type=int, default=1000)
+        parser.add_argument('--comments', type=int, default=2000)
+        parser.add_argument('--follows', type=int, default=200)
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--gunicorn', type=int, metavar='WORKERS',
+                            help='Replay over HTTP against gunicorn workers')
+        parser.add_argument('--asgi', action='store_true',
+                            help='Run gunicorn with uvicorn workers of '
+                                 'ASGI application')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--save', metavar='PATH',
+                            help='Store results as new baseline')
+        parser.add_argument('--compare', metavar='PATH',
+                            help='Fail on regressions against baseline')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed relative growth of p95 latency')
+
+    def handle(self, *args, **options):
+        mix = benchmark.load_mix(options['mix'])
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        try:
+            if (options['gunicorn'] and
+                    connection.creation.is_in_memory_db(
+                        connection.settings_dict['NAME'])):
+                raise CommandError('gunicorn mode needs a database shared '
+                                   'between processes')
+            with benchmark.own_cache():
+                benchmark.seed(options['users'], options['groups'],
+                               options['posts'], options['comments'],
+                               options['follows'])
+                if options['gunicorn']:
+                    result = benchmark.run_gunicorn(
+                        options['requests'], options['gunicorn'],
+                        options['concurrency'], mix, options['asgi'])
+                else:
+                    result = benchmark.run_inprocess(options['requests'],
+                                                     mix)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.stdout.write(json.dumps(result, indent=2, ensure_ascii=False))
+        if options['save']:
+            with open(options['save'], 'w') as baseline:
+                json.dump(result, baseline, indent=2, ensure_ascii=False)
+        if options['compare']:
+            with open(options['compare']) as baseline:
+                regressions = benchmark.compare(
+                    result, json.load(baseline), options['tolerance'])
+            if regressions:
+                raise CommandError('Regressions:\n' + '\n'.join(regressions))
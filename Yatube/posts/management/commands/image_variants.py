@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Make image variants of posts uploaded before they were made'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Remake variants of every post image')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').exclude(image=None)
+        if not options['all']:
+            posts = posts.filter(image_variants=None)
+        count = 0
+        for post_id in posts.values_list('id', flat=True).iterator():
+            try:
+                thumbnails.make_variants(post_id)
+            except Exception as error:
+                self.stderr.write(f'Post {post_id}: {error}')
+                continue
+            count += 1
+        self.stdout.write(f'Image variants made for {count} posts')
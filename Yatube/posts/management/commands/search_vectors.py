@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Group, Post
+from posts.search import is_full_text, update_search_vector
+
+
+class Command(BaseCommand):
+    help = ('Rebuild full text search vectors of all posts, such as ones '
+            'written before search or by bulk queries')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.all()
+        if not is_full_text(posts):
+            self.stdout.write('Full text search needs PostgreSQL, '
+                              'nothing to rebuild')
+            return
+        count = update_search_vector(posts.filter(group=None), '')
+        for pk, title in Group.objects.values_list('pk', 'title').iterator():
+            count += update_search_vector(posts.filter(group_id=pk), title)
+        self.stdout.write(self.style.SUCCESS(
+            f'Search vectors rebuilt for {count} posts'))
@@ -1,5 +1,29 @@
 from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models import Count, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from Yatube.invalidation import InvalidatingQuerySet
+from .indexes import SearchIndex
+
+
+def _count(queryset, by):
+    return Coalesce(Subquery(queryset.order_by().values(by).annotate(
+        value=Count('id')).values('value')), Value(0))
+
+
+class GroupQuerySet(InvalidatingQuerySet):
+    """Groups queryset able to count their posts and followers"""
+    def with_counts(self):
+        """Groups annotated with posts_count of published posts and
+        followers_count, counted by subqueries of the same query"""
+        from follows.models import Follow  # follows app depends on posts
+        return self.annotate(
+            posts_count=_count(Post.objects.filter(group=OuterRef('pk'),
+                                                   moderation=True), 'group'),
+            followers_count=_count(Follow.objects.filter(
+                group=OuterRef('pk')), 'group'))
 
 
 class Group(models.Model):
@@ -8,11 +32,13 @@ class Group(models.Model):
     creator = models.ForeignKey(User, verbose_name="Создатель",
                                 on_delete=models.CASCADE, max_length=70,
                                 null=True)
-    slug = models.SlugField("url", max_length=30)
+    slug = models.SlugField("url", max_length=30, unique=True)
     description = models.TextField("Описание", max_length=500)
     template = models.CharField("Шаблон", max_length=100, default='group.html')
     moderation = models.BooleanField('Модерация', default=True)
 
+    objects = GroupQuerySet.as_manager()
+
     def __str__(self):
         return self.title
 
@@ -21,6 +47,27 @@ class Group(models.Model):
         verbose_name_plural = "Группы"
 
 
+class PostQuerySet(InvalidatingQuerySet):
+    """Posts queryset knowing which posts are visible to public"""
+    PUBLISHED = Q(Q(group=None) | Q(group__moderation=True), moderation=True)
+
+    def published(self):
+        """Posts passed moderation and not in group taken off it"""
+        return self.filter(self.PUBLISHED)
+
+    def visible_to(self, user):
+        """Published posts and unpublished ones of user"""
+        if user.is_anonymous:
+            return self.published()
+        return self.filter(self.PUBLISHED | Q(author=user))
+
+
+class PublishedManager(models.Manager.from_queryset(PostQuerySet)):
+    """Manager of published posts only"""
+    def get_queryset(self):
+        return super().get_queryset().published()
+
+
 class Post(models.Model):
     """Class of Post model"""
     author = models.ForeignKey(User, verbose_name="Автор",
@@ -32,9 +79,16 @@ class Post(models.Model):
     title = models.CharField("Заголовок", max_length=200)
     text = models.TextField("Текст", max_length=5000)
     published_date = models.DateTimeField("Дата публикации", auto_now_add=True)
+    updated = models.DateTimeField("Дата изменения", auto_now=True)
     moderation = models.BooleanField("Модерация", default=True)
     slug = models.SlugField("url", max_length=30)
     image = models.ImageField(upload_to='posts/', blank=True, null=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+    comments_count = models.PositiveIntegerField("Комментариев", default=0,
+                                                 editable=False)
+
+    objects = PostQuerySet.as_manager()
+    published = PublishedManager()
 
     def __str__(self):
         return self.title
@@ -42,6 +96,71 @@ class Post(models.Model):
     class Meta:
         verbose_name = "Пост"
         verbose_name_plural = "Посты"
+        indexes = [
+            models.Index(fields=('-published_date', '-id'),
+                         name='post_published_date_idx',
+                         condition=Q(moderation=True)),
+            models.Index(fields=('author', '-published_date', '-id'),
+                         name='post_published_author_idx',
+                         condition=Q(moderation=True)),
+            models.Index(fields=('group', '-published_date', '-id'),
+                         name='post_published_group_idx',
+                         condition=Q(moderation=True)),
+            SearchIndex(fields=('search_vector',),
+                        name='post_search_vector_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=('author', 'slug'),
+                                    name='post_author_slug_unique'),
+        ]
+
+
+class PostRedirect(models.Model):
+    """Former address of post, kept when its slug or author changes"""
+    author = models.ForeignKey(User, verbose_name="Автор",
+                               on_delete=models.CASCADE,
+                               related_name='+')
+    slug = models.SlugField("url", max_length=30)
+    post = models.ForeignKey(Post, verbose_name='Пост',
+                             on_delete=models.CASCADE,
+                             related_name='redirects')
+
+    def __str__(self):
+        return f'{self.author}/{self.slug}'
+
+    class Meta:
+        verbose_name = "Прежний адрес поста"
+        verbose_name_plural = "Прежние адреса постов"
+        constraints = [
+            models.UniqueConstraint(fields=('author', 'slug'),
+                                    name='post_redirect_unique'),
+        ]
+
+
+class ImageVariant(models.Model):
+    """Resized copy of post image in one format, made once per upload"""
+    FORMATS = (('avif', 'AVIF'), ('webp', 'WebP'), ('jpeg', 'JPEG'))
+
+    post = models.ForeignKey(Post, verbose_name='Пост',
+                             on_delete=models.CASCADE,
+                             related_name='image_variants')
+    format = models.CharField('Формат', max_length=4, choices=FORMATS)
+    width = models.PositiveIntegerField('Ширина')
+    height = models.PositiveIntegerField('Высота')
+    size = models.PositiveIntegerField('Размер, байт')
+    file = models.FileField('Файл', max_length=255)
+
+    def __str__(self):
+        return f'{self.format} {self.width}x{self.height}'
+
+    class Meta:
+        verbose_name = "Вариант изображения"
+        verbose_name_plural = "Варианты изображений"
+        ordering = ('post', 'format', 'width')
+        constraints = [
+            models.UniqueConstraint(fields=('post', 'format', 'width'),
+                                    name='image_variant_unique'),
+        ]
 
 
 class Comment(models.Model):
@@ -55,9 +174,15 @@ class Comment(models.Model):
     published_date = models.DateTimeField('Дата публикации', auto_now_add=True)
     text = models.TextField('Текст', max_length=1000)
 
+    objects = InvalidatingQuerySet.as_manager()
+
     def __str__(self):
         return str(self.id)
 
     class Meta:
         verbose_name = "Комментарий"
         verbose_name_plural = "Комментарии"
+        indexes = [
+            models.Index(fields=('post', 'published_date', 'id'),
+                         name='comment_post_date_idx'),
+        ]
@@ -0,0 +1,122 @@
+import json
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+
+
+class KeysetPage:
+    """Page of objects with cursors to neighbour pages"""
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @cached_property
+    def next_cursor(self):
+        if self._has_next:
+            return self.paginator.encode(self.object_list[-1])
+
+    @cached_property
+    def previous_cursor(self):
+        if self._has_previous:
+            return self.paginator.encode(self.object_list[0])
+
+
+class KeysetPaginator:
+    """Paginator which seeks by keys instead of OFFSET, newest first
+    unless descending is off.
+
+    Page is fetched by one query whatever deep it is, total count
+    is queried only if somebody asks for it"""
+    def __init__(self, queryset, per_page, keys=('published_date', 'id'),
+                 descending=True):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.keys = keys
+        self.descending = descending
+
+    @cached_property
+    def count(self):
+        return self.queryset.count()
+
+    def encode(self, obj):
+        values = []
+        for key in self.keys:
+            value = getattr(obj, key)
+            values.append(value.isoformat() if hasattr(value, 'isoformat')
+                          else value)
+        return urlsafe_base64_encode(json.dumps(values).encode())
+
+    def decode(self, cursor):
+        """Key values from cursor or None if cursor is broken"""
+        try:
+            values = json.loads(urlsafe_base64_decode(cursor))
+            if len(values) != len(self.keys):
+                return None
+            return [self._to_python(key, value)
+                    for key, value in zip(self.keys, values)]
+        except (ValueError, TypeError):
+            return None
+
+    def _to_python(self, key, value):
+        try:
+            field = self.queryset.model._meta.get_field(key)
+        except FieldDoesNotExist:
+            annotation = self.queryset.query.annotations.get(key)
+            if annotation is None:
+                return value
+            field = annotation.output_field
+        if value is None:
+            raise ValueError(key)
+        return field.to_python(value)
+
+    def _seek(self, values, lookup):
+        condition = Q()
+        for i, key in enumerate(self.keys):
+            equal = {k: v for k, v in zip(self.keys[:i], values[:i])}
+            condition |= Q(**equal, **{f'{key}__{lookup}': values[i]})
+        return condition
+
+    def _order(self, forward):
+        prefix = '-' if forward == self.descending else ''
+        return [f'{prefix}{key}' for key in self.keys]
+
+    def get_page(self, after=None, before=None):
+        after = after and self.decode(after)
+        before = before and self.decode(before)
+        forward, backward = ('lt', 'gt') if self.descending else ('gt', 'lt')
+        if before:
+            queryset = self.queryset.filter(
+                self._seek(before, backward)).order_by(*self._order(False))
+            objects = list(queryset[:self.per_page + 1])
+            if objects:
+                has_previous = len(objects) > self.per_page
+                objects = objects[:self.per_page][::-1]
+                return KeysetPage(objects, self, True, has_previous)
+        queryset = self.queryset.order_by(*self._order(True))
+        if after:
+            queryset = queryset.filter(self._seek(after, forward))
+        objects = list(queryset[:self.per_page + 1])
+        return KeysetPage(objects[:self.per_page], self,
+                          len(objects) > self.per_page, bool(after))
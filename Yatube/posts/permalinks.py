@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import PostRedirect
+
+
+def _key(author_id, slug):
+    return f'post_id:{author_id}:{slug}'
+
+
+def cached_id(author, slug):
+    """Id of post of author by slug if it is cached, None otherwise"""
+    return cache.get(_key(author.pk, slug))
+
+
+def remember(author, slug, pk):
+    """Cache id of post of author by slug till post leaves the address,
+    edits and comments of post do not outdate it"""
+    cache.set(_key(author.pk, slug), pk, settings.POST_ID_CACHE_TIMEOUT)
+
+
+def forget(author_id, slug):
+    """Drop cached id of post which left the address, again after commit
+    so id read by others meanwhile does not outlive transaction"""
+    key = _key(author_id, slug)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def moved_post(author, slug):
+    """Post once addressed by author and slug, with its current author,
+    None if there was none. One lookup whatever many times post moved"""
+    redirect = PostRedirect.objects.select_related(
+        'post__author__profile').filter(author_id=author.pk,
+                                        slug=slug).first()
+    return redirect and redirect.post
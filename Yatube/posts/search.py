@@ -0,0 +1,45 @@
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connections
+from django.db.models import BigIntegerField, F, Q, Value
+from django.db.models.functions import Cast
+
+SEARCH_CONFIG = 'russian'
+
+# Rank is paged as integer of its millionths, float4 rank compared with
+# float8 cursor would skip or repeat posts of equal rank
+RANK_SCALE = 10 ** 6
+
+
+def is_full_text(queryset):
+    return connections[queryset.db].vendor == 'postgresql'
+
+
+def search_vector(group_title):
+    """Weighted vector of post title, text and title of its group"""
+    return (SearchVector('title', weight='A', config=SEARCH_CONFIG) +
+            SearchVector('text', weight='B', config=SEARCH_CONFIG) +
+            SearchVector(Value(group_title or ''), weight='C',
+                         config=SEARCH_CONFIG))
+
+
+def update_search_vector(posts, group_title):
+    """Refresh vectors of posts queryset belonging to one group, returns
+    number of posts refreshed"""
+    if not is_full_text(posts):
+        return 0
+    return posts.silent_update(search_vector=search_vector(group_title))
+
+
+def search_posts(queryset, text):
+    """Posts matching text and keys to order them by relevance.
+
+    Databases without full text search fall back to substring match"""
+    if not is_full_text(queryset):
+        return queryset.filter(
+            Q(title__icontains=text) | Q(text__icontains=text) |
+            Q(group__title__icontains=text)), ('published_date', 'id')
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+    return queryset.filter(search_vector=query).annotate(
+        rank=Cast(SearchRank(F('search_vector'), query) * RANK_SCALE,
+                  BigIntegerField())), ('rank', 'id')
@@ -0,0 +1,76 @@
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, post_init
+from django.dispatch import receiver
+
+from Yatube import invalidation
+from Yatube.invalidation import list_tag, tag
+from . import permalinks, thumbnails
+from .models import Post, PostRedirect, Group, Comment, ImageVariant
+from .search import update_search_vector
+
+
+invalidation.watch(Post, lambda post: (
+    list_tag(Post), tag(Post, post.pk), tag(User, post.author_id),
+    tag(Group, post.group_id)))
+invalidation.watch(Group, lambda group: (list_tag(Group),
+                                         tag(Group, group.pk)))
+invalidation.watch(Comment, lambda comment: (tag(Post, comment.post_id),))
+
+
+@receiver(post_init, sender=Post)
+def post_loaded(sender, instance, **kwargs):
+    image = instance.__dict__.get('image')
+    instance._thumbnail_source = getattr(image, 'name', image) or ''
+    instance._address = (instance.__dict__.get('author_id'),
+                         instance.__dict__.get('slug'))
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    update_search_vector(Post.objects.filter(pk=instance.pk),
+                         instance.group.title if instance.group_id else '')
+    if (instance.image.name or '') != instance._thumbnail_source:
+        if not created:
+            instance.image_variants.all().delete()
+        if instance.image:
+            thumbnails.schedule(instance.pk)
+    instance._thumbnail_source = instance.image.name or ''
+    author_id, slug = instance._address
+    if (not created and author_id is not None and slug and
+            (author_id, slug) != (instance.author_id, instance.slug)):
+        PostRedirect.objects.update_or_create(
+            author_id=author_id, slug=slug, defaults={'post': instance})
+        permalinks.forget(author_id, slug)
+    instance._address = (instance.author_id, instance.slug)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    permalinks.forget(*instance._address)
+
+
+@receiver(post_delete, sender=ImageVariant)
+def image_variant_deleted(sender, instance, **kwargs):
+    thumbnails.delete_file.enqueue(instance.file.name)
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, **kwargs):
+    if not created:
+        update_search_vector(instance.posts.all(), instance.title)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created and instance.post_id is not None:
+        Post.objects.filter(pk=instance.post_id).silent_update(
+            comments_count=F('comments_count') + 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    if instance.post_id is not None:
+        Post.objects.filter(pk=instance.post_id,
+                            comments_count__gt=0).silent_update(
+            comments_count=F('comments_count') - 1)
@@ -1,12 +1,50 @@
+import asyncio
+import gzip
+import json
 import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from io import BytesIO, StringIO
 from os.path import exists
+from unittest import skipUnless
+from unittest.mock import patch
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.admin import site
 from django.contrib.auth.models import User
 from django.core.cache import cache
-from django.test import TestCase, Client
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.http import HttpResponse
+from django.templatetags.static import static
+from django.test import (AsyncClient, Client, RequestFactory, TestCase,
+                         TransactionTestCase, override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from PIL import Image, ImageFile
 
+from follows.feed import follows_feed
+from follows.models import Follow, FeedEntry
+from jobs.worker import run_pending
+from posts import benchmark, groups
+from posts.admin import PostAdmin
+from posts.cards import render_image
 from posts.models import Post, Group, Comment
+from posts.paginator import KeysetPaginator
+from posts.search import search_posts
+from posts.uploads import _too_large_error
+from posts.views import MainPageView
+from Users import counters
+from Yatube.caching import get_or_compute
+from Yatube.metrics import QueryBudgetExceeded
+from Yatube.replicas import (PIN_COOKIE, ReplicaMiddleware, ReplicaRouter,
+                             primary)
 
 
 class TestManyUrlsToCheck:
@@ -184,8 +222,226 @@ class ImagesTest(TestCase):
         self.assertTemplateUsed(response, 'create_edit_post.html')
 
 
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(),
+                   POST_IMAGE_WIDTHS=(480, 800, 1200),
+                   POST_IMAGE_FORMATS=('webp', 'jpeg'))
+class ThumbnailTest(TestCase):
+    """Test image variants are made after upload and placeholder before"""
+    def setUp(self) -> None:
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser',
+                                             password='difficult_password')
+        self.client.login(username='testuser', password='difficult_password')
+        cache.clear()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+    def image(self, size=(1600, 900), exif=None):
+        content = BytesIO()
+        Image.new('RGB', size, 'red').save(content, 'JPEG',
+                                           exif=exif or b'')
+        return SimpleUploadedFile('test_img.jpg', content.getvalue(),
+                                  content_type='image/jpeg')
+
+    def test_placeholder_then_variants(self):
+        self.client.post(reverse('create_post'), data={
+            'title': 'title', 'text': 'text', 'slug': 'slug',
+            'image': self.image()})
+        post = Post.objects.get(slug='slug')
+        self.assertFalse(post.image_variants.exists())
+        response = self.client.get(reverse('main_page'))
+        self.assertContains(response, 'Изображение обрабатывается')
+
+        run_pending()
+        variants = list(post.image_variants.all())
+        self.assertEqual(
+            [(v.format, v.width, v.height) for v in variants],
+            [('jpeg', 480, 160), ('jpeg', 800, 266), ('jpeg', 1200, 400),
+             ('webp', 480, 160), ('webp', 800, 266), ('webp', 1200, 400)])
+        for variant in variants:
+            self.assertEqual(variant.size, variant.file.size)
+        response = self.client.get(reverse('main_page'))
+        self.assertNotContains(response, 'Изображение обрабатывается')
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, f'{variants[0].file.url} 480w')
+        self.assertContains(response, f'src="{variants[2].file.url}"')
+
+    def test_upright_without_metadata(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010f] = 'Camera'
+        post = Post.objects.create(
+            author=self.user, title='title', text='text', slug='slug',
+            image=self.image((300, 1000), exif.tobytes()))
+        run_pending()
+        variant = post.image_variants.filter(format='jpeg').last()
+        self.assertEqual((variant.width, variant.height), (800, 266))
+        with Image.open(variant.file) as image:
+            self.assertEqual(image.size, (800, 266))
+            self.assertFalse(image.getexif())
+
+    def test_new_image_replaces_variants(self):
+        post = Post.objects.create(author=self.user, title='title',
+                                   text='text', slug='slug',
+                                   image=self.image())
+        run_pending()
+        old_files = [v.file.name for v in post.image_variants.all()]
+        post.image = self.image()
+        post.save()
+        run_pending()
+        new_files = [v.file.name for v in post.image_variants.all()]
+        self.assertEqual(len(new_files), 6)
+        self.assertFalse(set(old_files) & set(new_files))
+        for name in old_files:
+            self.assertFalse(default_storage.exists(name))
+
+    def test_cached_picture_needs_no_queries(self):
+        post = Post.objects.create(author=self.user, title='title',
+                                   text='text', slug='slug',
+                                   image=self.image())
+        run_pending()
+        post = Post.objects.get(pk=post.pk)
+        render_image(post)
+        with self.assertNumQueries(0):
+            self.assertIn('srcset', render_image(post))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(),
+                   POST_UPLOAD_MAX_SIDE=2000, POST_UPLOAD_MAX_PIXELS=10 ** 6)
+class UploadLimitsTest(TestCase):
+    """Test uploads are checked while streaming, before image is decoded"""
+    def setUp(self) -> None:
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser',
+                                             password='difficult_password')
+        self.client.login(username='testuser', password='difficult_password')
+
+    def tearDown(self) -> None:
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+    def image(self, size=(800, 600), image_format='PNG'):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, image_format)
+        return buffer.getvalue()
+
+    def upload(self, size=(800, 600), image_format='PNG', content=None):
+        content = content or self.image(size, image_format)
+        return self.client.post(reverse('create_post'), data={
+            'title': 'title', 'text': 'text', 'slug': 'slug',
+            'image': SimpleUploadedFile('img.png', content)})
+
+    def uploads_left(self):
+        return os.listdir(os.path.join(settings.MEDIA_ROOT, '.uploads'))
+
+    def test_image_stored_without_decoding(self):
+        content = self.image()
+        with patch.object(ImageFile.ImageFile, 'load') as load:
+            response = self.upload(content=content)
+        load.assert_not_called()
+        self.assertRedirects(response, '/')
+        post = Post.objects.get(slug='slug')
+        self.assertEqual((post.image.width, post.image.height), (800, 600))
+        self.assertEqual(self.uploads_left(), [])
+
+    def test_too_large_dimensions(self):
+        for size in ((2001, 10), (1001, 1000)):
+            with self.subTest(size=size):
+                response = self.upload(size)
+                self.assertFormError(response, 'form', 'image',
+                                     _too_large_error())
+                self.assertFalse(Post.objects.exists())
+                self.assertEqual(self.uploads_left(), [])
+
+    @override_settings(POST_UPLOAD_MAX_BYTES=1000)
+    def test_too_many_bytes(self):
+        response = self.upload(content=os.urandom(2000))
+        self.assertFormError(response, 'form', 'image',
+                             'Файл больше 1000\xa0байт')
+        self.assertFalse(Post.objects.exists())
+
+    def test_not_allowed_format(self):
+        for kwargs in ({'image_format': 'BMP'}, {'content': b'text'}):
+            with self.subTest(**kwargs):
+                response = self.upload(**kwargs)
+                self.assertFormError(response, 'form', 'image',
+                                     'Загрузите правильное изображение')
+                self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_UPLOAD_MAX_BYTES=0,
+                       DATA_UPLOAD_MAX_MEMORY_SIZE=100)
+    def test_oversized_body_refused(self):
+        self.assertEqual(self.upload().status_code, 400)
+
+    def test_csrf_checked(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        response = client.post(reverse('create_post'), data={
+            'title': 'title', 'text': 'text', 'slug': 'slug'})
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class OriginalImageTest(TestCase):
+    """Test original image is sent after access check"""
+    def setUp(self) -> None:
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser',
+                                             password='difficult_password')
+        content = BytesIO()
+        Image.new('RGB', (40, 30), 'red').save(content, 'JPEG')
+        self.post = Post.objects.create(
+            author=self.user, title='title', text='text', slug='slug',
+            image=SimpleUploadedFile('img.jpg', content.getvalue()))
+        self.url = reverse('original_image', args=['testuser', 'slug'])
+
+    def tearDown(self) -> None:
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+
+    def test_sent_by_worker_without_accel(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content),
+                         self.post.image.read())
+
+    @override_settings(MEDIA_ACCEL_REDIRECT_URL='/protected-media/')
+    def test_sent_by_nginx_with_accel(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'],
+                         f'/protected-media/{self.post.image.name}')
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response.content, b'')
+
+    def test_unpublished_only_for_author(self):
+        Post.objects.filter(pk=self.post.pk).update(moderation=False)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+
+class StaticFilesTest(TestCase):
+    """Test static files are collected under hashed names, compressed"""
+    def setUp(self) -> None:
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_collected_hashed_and_compressed(self):
+        with override_settings(STATIC_ROOT=self.root):
+            self.assertEqual(static('admin/css/base.css'),
+                             '/static/admin/css/base.css')
+            call_command('collectstatic', interactive=False, verbosity=0)
+            url = static('admin/css/base.css')
+        self.assertRegex(url, r'^/static/admin/css/base\.[0-9a-f]{12}\.css$')
+        path = os.path.join(self.root, url[len('/static/'):])
+        with open(path, 'rb') as original, \
+                gzip.open(path + '.gz') as compressed:
+            self.assertEqual(compressed.read(), original.read())
+
+
 class CacheTest(TestCase):
-    """Cache testing with new post creation on mane page"""
+    """Cache testing of post cards with new post creation on mane page"""
     def setUp(self) -> None:
         self.client = Client()
         self.user = User.objects.create_user(username='testuser',
@@ -196,18 +452,332 @@ class CacheTest(TestCase):
                                 slug=f'slug_{i}', author=self.user)
 
     def test_visit_main_page(self):
-        with self.assertNumQueries(2):
+        with self.assertNumQueries(1):
             response = self.client.get(reverse('main_page'))
             self.assertEqual(response.status_code, 200)
             response = self.client.get(reverse('main_page'))
             self.assertEqual(response.status_code, 200)
 
-    def test_delay_new_post(self):
+    def test_new_post_shown_at_once(self):
         self.client.get(reverse('main_page'))
         post = Post.objects.create(title=f'Title_delay', text=f'Text_delay',
                                    slug=f'slug_delay', author=self.user)
         response = self.client.get(reverse('main_page'))
-        self.assertNotContains(response, post.title and post.text)
+        self.assertContains(response, post.title)
+
+    def test_card_cached_till_post_changes(self):
+        self.client.get(reverse('main_page'))
+        Post.objects.filter(slug='slug_4').silent_update(title='Silent_title')
+        response = self.client.get(reverse('main_page'))
+        self.assertNotContains(response, 'Silent_title')
+        post = Post.objects.get(slug='slug_4')
+        post.save()
+        response = self.client.get(reverse('main_page'))
+        self.assertContains(response, 'Silent_title')
+
+    def test_pages_outdated_by_changes(self):
+        group = Group.objects.create(title='test_group', slug='test_group')
+        post = Post.objects.get(slug='slug_4')
+        urls = [reverse('main_page'), reverse('profile', args=['testuser']),
+                reverse('post_view', args=['testuser', 'slug_4'])]
+        changes = [
+            lambda: Post.objects.filter(pk=post.pk).update(title='Updated'),
+            lambda: Comment.objects.create(post=post, author=self.user,
+                                           text='New_comment'),
+            lambda: Post.objects.create(title='Created', text='text',
+                                        slug='created', author=self.user),
+            lambda: Follow.objects.create(user=self.user, group=group),
+            lambda: Post.objects.filter(pk=post.pk).update(moderation=False),
+        ]
+        for change in changes:
+            for url in urls:
+                self.client.get(url)
+            with self.assertNumQueries(0):
+                self.client.get(urls[0])
+            change()
+            with self.subTest(change=change):
+                for url in urls:
+                    with CaptureQueriesContext(connection) as queries:
+                        self.client.get(url)
+                    self.assertTrue(queries, url)
+
+    def test_update_reads_only_keys_of_rows(self):
+        with CaptureQueriesContext(connection) as queries:
+            Post.objects.filter(author=self.user).update(title='Updated')
+        select = queries[0]['sql']
+        self.assertIn('"author_id"', select)
+        self.assertNotIn('"text"', select)
+
+    def test_unrelated_change_keeps_pages(self):
+        other = User.objects.create_user(username='other')
+        group = Group.objects.create(title='test_group', slug='test_group')
+        url = reverse('post_view', args=['testuser', 'slug_4'])
+        self.client.get(url)
+        Follow.objects.create(user=other, group=group)
+        Comment.objects.create(post=Post.objects.get(slug='slug_0'),
+                               author=other, text='text')
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+    def test_card_forgotten_on_author_change(self):
+        self.client.get(reverse('main_page'))
+        self.user.username = 'renamed_user'
+        self.user.save()
+        response = self.client.get(reverse('main_page'))
+        self.assertContains(response, 'renamed_user')
+
+    def test_edit_link_not_shared_between_users(self):
+        self.client.login(username='testuser', password='difficult_password')
+        response = self.client.get(reverse('main_page'))
+        self.assertContains(response, 'Редактировать')
+        self.client.logout()
+        response = self.client.get(reverse('main_page'))
+        self.assertNotContains(response, 'Редактировать')
+
+
+class SharedCacheTest(TestCase):
+    """Test single flight recomputation, early refresh and stale values"""
+    def setUp(self) -> None:
+        cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return self.calls
+
+    def test_value_computed_once(self):
+        self.assertEqual(get_or_compute('key', self.compute, 60), 1)
+        self.assertEqual(get_or_compute('key', self.compute, 60), 1)
+        self.assertEqual(self.calls, 1)
+
+    @override_settings(CACHE_LOCK_WAIT=0.1)
+    def test_stale_value_served_while_locked(self):
+        get_or_compute('key', self.compute, -1)
+        cache.add('key:lock', 1)
+        self.assertEqual(get_or_compute('key', self.compute, 60), 1)
+        cache.delete('key:lock')
+        self.assertEqual(get_or_compute('key', self.compute, 60), 2)
+        self.assertEqual(get_or_compute('key', self.compute, 60), 2)
+
+    @override_settings(CACHE_LOCK_WAIT=5)
+    def test_wait_ends_when_lock_released_without_value(self):
+        cache.add('key:lock', 1)
+        threading.Timer(0.1, cache.delete, ['key:lock']).start()
+        start = time.monotonic()
+        self.assertEqual(get_or_compute('key', self.compute, 60), 1)
+        self.assertLess(time.monotonic() - start, 1)
+
+    @override_settings(CACHE_EARLY_REFRESH_BETA=10 ** 9)
+    def test_slow_value_refreshed_early(self):
+        get_or_compute('key', lambda: time.sleep(0.01) or 'old', 60)
+        self.assertEqual(get_or_compute('key', lambda: 'new', 60), 'new')
+
+    def test_group_list_cached_for_anonymous(self):
+        user = User.objects.create_user(username='testuser')
+        Group.objects.create(title='first_group', slug='first')
+        self.client.get(reverse('group_list'))
+        with self.assertNumQueries(0):
+            self.client.get(reverse('group_list'))
+        Group.objects.create(title='second_group', slug='second')
+        response = self.client.get(reverse('group_list'))
+        self.assertContains(response, 'second_group')
+        self.client.force_login(user)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('group_list'))
+        self.assertContains(response, 'second_group')
+
+
+class ReplicaRoutingTest(TransactionTestCase):
+    """Test reads of GET requests go to replica unless client wrote"""
+    def setUp(self) -> None:
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+        cache.clear()
+
+    def serve(self, request, view):
+        return ReplicaMiddleware(view)(request)
+
+    def test_reads_of_get_on_replica(self):
+        reads = []
+
+        def view(request):
+            reads.append(self.router.db_for_read(Post))
+            with primary():
+                reads.append(self.router.db_for_read(Post))
+            with transaction.atomic():
+                reads.append(self.router.db_for_read(Post))
+            return HttpResponse()
+
+        response = self.serve(self.factory.get('/'), view)
+        self.assertEqual(reads, ['replica', 'default', 'default'])
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_writer_pinned_to_default(self):
+        reads = []
+
+        def view(request):
+            self.router.db_for_write(Post)
+            reads.append(self.router.db_for_read(Post))
+            return HttpResponse()
+
+        response = self.serve(self.factory.post('/'), view)
+        self.assertEqual(reads, ['default'])
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'],
+                         settings.REPLICA_PIN_SECONDS)
+
+        request = self.factory.get('/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        reads.clear()
+        self.serve(request, lambda request: HttpResponse(
+            reads.append(self.router.db_for_read(Post))))
+        self.assertEqual(reads, ['default'])
+
+    def test_cached_values_computed_on_default(self):
+        def view(request):
+            return HttpResponse(get_or_compute(
+                'key', lambda: self.router.db_for_read(Post), 60))
+
+        response = self.serve(self.factory.get('/'), view)
+        self.assertEqual(response.content, b'default')
+
+
+@skipUnless(connection.settings_dict['ENGINE'] == 'Yatube.postgresql_pool',
+            'needs pooled PostgreSQL backend')
+class ConnectionPoolTest(TransactionTestCase):
+    """Test connections are given back to pool and reused"""
+    def test_connection_reused(self):
+        connection.ensure_connection()
+        raw = connection.connection
+        connection.close()
+        connection.ensure_connection()
+        self.assertIs(connection.connection, raw)
+
+    def test_broken_connection_replaced(self):
+        connection.ensure_connection()
+        raw = connection.connection
+        connection.close()
+        raw.close()
+        connection.ensure_connection()
+        self.assertIsNot(connection.connection, raw)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+
+
+class KeysetPaginationTest(TestCase):
+    """Test cursor pagination walks all posts with constant queries"""
+    def setUp(self) -> None:
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser',
+                                             password='difficult_password')
+        for i in range(7):
+            Post.objects.create(title=f'Title{i}', text=f'Text{i}',
+                                slug=f'slug_{i}', author=self.user)
+
+    def titles(self, response):
+        return [post.title for post in response.context['page']]
+
+    def test_walk_forward_and_back(self):
+        response = self.client.get(reverse('profile', args=['testuser']))
+        self.assertEqual(self.titles(response), ['Title6', 'Title5', 'Title4'])
+        page = response.context['page']
+        response = self.client.get(reverse('profile', args=['testuser']),
+                                   {'after': page.next_cursor})
+        self.assertEqual(self.titles(response), ['Title3', 'Title2', 'Title1'])
+        page = response.context['page']
+        response = self.client.get(reverse('profile', args=['testuser']),
+                                   {'before': page.previous_cursor})
+        self.assertEqual(self.titles(response), ['Title6', 'Title5', 'Title4'])
+        self.assertFalse(response.context['page'].has_previous())
+
+    def test_last_page_has_no_next(self):
+        last = Post.objects.order_by('published_date', 'id')[1]
+        paginator = KeysetPaginator(Post.objects.all(), 3)
+        page = paginator.get_page(after=paginator.encode(last))
+        self.assertEqual([post.title for post in page], ['Title0'])
+        self.assertFalse(page.has_next())
+
+    def test_broken_cursor_gives_first_page(self):
+        response = self.client.get(reverse('main_page'), {'after': 'broken'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Title6')
+
+    def test_numbered_pages_still_work(self):
+        response = self.client.get(reverse('main_page'), {'page': 3})
+        self.assertEqual(self.titles(response), ['Title0'])
+
+    @override_settings(LEGACY_PAGE_MAX=2)
+    def test_deep_numbered_pages_not_found(self):
+        response = self.client.get(reverse('main_page'), {'page': 3})
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse('profile', args=['testuser']),
+                                   {'page': 5000})
+        self.assertEqual(response.status_code, 404)
+
+
+class SearchTest(TestCase):
+    """Test search finds posts by title, text and group title"""
+    def setUp(self) -> None:
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser',
+                                             password='difficult_password')
+        self.group = Group.objects.create(title='Котики',
+                                          slug='test_group_slug')
+        Post.objects.create(author=self.user, title='Про собак',
+                            text='Собаки лают', slug='dogs')
+        Post.objects.create(author=self.user, group=self.group,
+                            title='Вечер', text='Мурчание', slug='cats')
+
+    def test_search_by_title_and_group(self):
+        response = self.client.get(reverse('search'), {'q': 'собак'})
+        self.assertContains(response, 'Про собак')
+        self.assertNotContains(response, 'Мурчание')
+        response = self.client.get(reverse('search'), {'q': 'Котики'})
+        self.assertContains(response, 'Мурчание')
+
+    def test_empty_query(self):
+        response = self.client.get(reverse('search'), {'q': ' '})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Ничего не найдено')
+
+    @skipUnless(connection.vendor == 'postgresql', 'needs full text search')
+    def test_vector_follows_group_title(self):
+        self.group.title = 'Пёсики'
+        self.group.save()
+        posts, _ = search_posts(Post.objects.all(), 'Пёсики')
+        self.assertEqual([post.slug for post in posts], ['cats'])
+
+    @skipUnless(connection.vendor == 'postgresql', 'needs full text search')
+    def test_command_fills_missing_vectors(self):
+        Post.objects.all().silent_update(search_vector=None)
+        out = StringIO()
+        call_command('search_vectors', stdout=out)
+        self.assertIn('rebuilt for 2 posts', out.getvalue())
+        posts, _ = search_posts(Post.objects.all(), 'Котики')
+        self.assertEqual([post.slug for post in posts], ['cats'])
+
+    def test_command_without_full_text(self):
+        out = StringIO()
+        call_command('search_vectors', stdout=out)
+        self.assertTrue(out.getvalue())
+
+    @skipUnless(connection.vendor == 'postgresql', 'needs full text search')
+    def test_equal_ranks_paged_once(self):
+        for i in range(5):
+            Post.objects.create(author=self.user, title='Собаки',
+                                text='Собаки', slug=f'dogs{i}')
+        posts, keys = search_posts(Post.objects.all(), 'собаки')
+        paginator = KeysetPaginator(posts, 2, keys)
+        slugs, cursor = [], None
+        while True:
+            page = paginator.get_page(after=cursor)
+            slugs += [post.slug for post in page]
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        self.assertEqual(sorted(slugs), sorted(
+            Post.objects.filter(slug__startswith='dogs').values_list(
+                'slug', flat=True)))
 
 
 class CommentsTest(TestCase):
@@ -247,6 +817,119 @@ class CommentsTest(TestCase):
         self.client.post(reverse('delete_comment', args=[comment]))
         self.assertEqual(Comment.objects.all().count(), 0)
 
+    def test_comments_count(self):
+        comment = Comment.objects.create(post=self.post, author=self.user,
+                                         text='text')
+        Comment.objects.create(post=self.post, author=self.user, text='text')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 2)
+        comment.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        Post.objects.filter(pk=self.post.pk).update(comments_count=0)
+        counters.rebuild()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+
+    def test_comments_paginated_by_cursor(self):
+        for i in range(45):
+            Comment.objects.create(post=self.post, author=self.user,
+                                   text=f'comment{i}')
+        url = reverse('post_view', args=[self.user.username, self.post.slug])
+        response = self.client.get(url)
+        page = response.context['comments']
+        self.assertEqual([c.text for c in page],
+                         [f'comment{i}' for i in range(20)])
+        self.assertContains(response, 'Комментарии: 45')
+        more = reverse('comments', args=[self.user.username, self.post.slug])
+        response = self.client.get(more, {'after': page.next_cursor,
+                                          'format': 'json'})
+        data = response.json()
+        self.assertEqual([c['text'] for c in data['comments']],
+                         [f'comment{i}' for i in range(20, 40)])
+        response = self.client.get(more, {'after': data['next']})
+        self.assertContains(response, 'comment44')
+        self.assertNotContains(response, 'Показать ещё')
+
+    def test_post_page_queries_do_not_grow(self):
+        url = reverse('post_view', args=[self.user.username, self.post.slug])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(url)
+        for i in range(30):
+            author = User.objects.create_user(username=f'commenter{i}')
+            Comment.objects.create(post=self.post, author=author, text='text')
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(url)
+        self.assertEqual(len(few), len(many))
+
+
+class PermalinkTest(TestCase):
+    """Test posts are addressed by author and slug and renamed ones are
+    redirected from their former addresses"""
+    def setUp(self) -> None:
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser',
+                                             password='difficult_password')
+        self.other = User.objects.create_user(username='other')
+        self.post = Post.objects.create(author=self.user, title='Мой пост',
+                                        text='text', slug='same')
+        self.other_post = Post.objects.create(author=self.other,
+                                              title='Чужой пост',
+                                              text='text', slug='same')
+        self.client.force_login(self.user)
+
+    def rename(self, slug):
+        self.client.post(
+            reverse('post_edit', args=['testuser', self.post.slug]),
+            {'title': 'Мой пост', 'text': 'text', 'slug': slug})
+        self.post.refresh_from_db()
+
+    def test_same_slug_of_different_authors(self):
+        self.assertContains(
+            self.client.get(reverse('post_view', args=['other', 'same'])),
+            'Чужой пост')
+        self.client.post(reverse('delete_post', args=['same']))
+        self.assertFalse(Post.objects.filter(pk=self.post.pk).exists())
+        self.assertTrue(Post.objects.filter(pk=self.other_post.pk).exists())
+
+    def test_slug_unique_for_author(self):
+        Post.objects.create(author=self.user, title='title', text='text',
+                            slug='taken')
+        response = self.client.post(reverse('create_post'), {
+            'title': 'title', 'text': 'text', 'slug': 'taken'})
+        self.assertFormError(response, 'form', 'slug',
+                             'У вас уже есть запись с таким url')
+        with self.assertRaises(IntegrityError):
+            Post.objects.create(author=self.user, title='title', text='text',
+                                slug='taken')
+
+    def test_renamed_post_redirected_from_former_addresses(self):
+        self.rename('second')
+        self.rename('third')
+        self.assertEqual(self.post.slug, 'third')
+        for slug in ('same', 'second'):
+            response = self.client.get(
+                reverse('comments', args=['testuser', slug]), {'after': 'x'})
+            self.assertRedirects(
+                response, reverse('comments', args=['testuser', 'third']) +
+                '?after=x', status_code=301, fetch_redirect_response=False)
+        self.client.post(reverse('add_comment', args=['testuser', 'same']),
+                         {'text': 'Комментарий'})
+        self.assertEqual(self.post.comments.get().text, 'Комментарий')
+        self.assertEqual(
+            self.client.get(reverse('post_view', args=['other', 'second']))
+            .status_code, 404)
+
+    def test_post_at_former_address_of_other_post_wins(self):
+        self.rename('second')
+        Post.objects.create(author=self.user, title='Новый пост',
+                            text='text', slug='same')
+        self.assertContains(
+            self.client.get(reverse('post_view', args=['testuser', 'same'])),
+            'Новый пост')
+
 
 class GroupListTest(TestCase):
     """Group output test"""
@@ -263,6 +946,196 @@ class GroupListTest(TestCase):
                             'test_group1' and 'test_group_slug1' and
                             'test_group2' and 'test_group_slug2')
 
+    @override_settings(GROUP_LIST_PAGE_SIZE=2)
+    def test_directory_paginated_with_counts(self):
+        Group.objects.create(title='test_group0', slug='test_group_slug0',
+                             moderation=False)
+        Group.objects.create(title='test_group3', slug='test_group_slug3')
+        user = User.objects.create_user(username='testuser')
+        Follow.objects.create(user=user, group=self.group)
+        for i, moderation in enumerate((True, True, False)):
+            Post.objects.create(author=user, group=self.group, title='title',
+                                text='text', slug=f'slug{i}',
+                                moderation=moderation)
+        response = self.client.get(reverse('group_list'))
+        titles = [group.title for group in response.context['page']
+                  ['object_list']]
+        self.assertEqual(titles, ['test_group1', 'test_group2'])
+        self.assertContains(response, 'Записей: 2, подписчиков: 1')
+        self.assertContains(response, 'Записей: 0, подписчиков: 0')
+        response = self.client.get(reverse('group_list'), {
+            'after': response.context['page']['next_cursor']})
+        self.assertEqual([group.title for group in
+                          response.context['page']['object_list']],
+                         ['test_group3'])
+
+    def test_slug_is_unique(self):
+        with self.assertRaises(IntegrityError):
+            Group.objects.create(title='copy', slug='test_group_slug1')
+
+
+class GroupResolveTest(TestCase):
+    """Test groups resolved by slug are forgotten when groups change"""
+    def setUp(self) -> None:
+        groups.clear()
+        self.group = Group.objects.create(title='test_group',
+                                          slug='test_group_slug')
+
+    def test_resolved_once_and_forgotten_on_change(self):
+        self.assertEqual(groups.resolve('test_group_slug'),
+                         (self.group.id, 'test_group', True))
+        with self.assertNumQueries(0):
+            groups.resolve('test_group_slug')
+        self.group.title = 'renamed'
+        self.group.save()
+        self.assertEqual(groups.resolve('test_group_slug').title, 'renamed')
+        self.group.delete()
+        self.assertIsNone(groups.resolve('test_group_slug'))
+
+    def test_group_taken_off_moderation_is_not_shown(self):
+        url = reverse('group', args=['test_group_slug'])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        Group.objects.filter(pk=self.group.pk).update(moderation=False)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(
+            self.client.get(reverse('group', args=['unknown'])).status_code,
+            404)
+
+
+class ConditionalGetTest(TestCase):
+    """Test unchanged pages are answered by 304 after one cheap query"""
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser')
+        self.author = User.objects.create_user(username='author')
+        self.group = Group.objects.create(title='test_group',
+                                          slug='test_group_slug')
+        self.post = Post.objects.create(author=self.author, group=self.group,
+                                        title='Title', text='Text',
+                                        slug='slug')
+        self.client.force_login(self.user)
+        self.urls = [reverse('main_page'),
+                     reverse('group', args=['test_group_slug']),
+                     reverse('profile', args=['author']),
+                     reverse('post_view', args=['author', 'slug'])]
+
+    def revisit(self, url):
+        etag = self.client.get(url)['ETag']
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_not_modified(self):
+        for url, queries in zip(self.urls, [2, 3, 3, 3]):
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                with self.assertNumQueries(queries):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+    def test_changes_modify(self):
+        changes = [
+            lambda: Comment.objects.create(post=self.post, author=self.user,
+                                           text='text'),
+            lambda: Follow.objects.create(user=self.user, author=self.author),
+            lambda: Follow.objects.create(user=self.user, group=self.group),
+            lambda: Group.objects.get(pk=self.group.pk).save(),
+            lambda: User.objects.get(pk=self.author.pk).save(),
+            lambda: Post.objects.filter(pk=self.post.pk).update(
+                moderation=False),
+        ]
+        expected = [[3], [2, 3], [1, 3], [0, 1, 3], [0, 1, 2, 3],
+                    [0, 1, 2, 3]]
+        for change, changed in zip(changes, expected):
+            etags = [self.client.get(url)['ETag'] for url in self.urls]
+            change()
+            for number, (url, etag) in enumerate(zip(self.urls, etags)):
+                with self.subTest(url=url, change=changed):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                    self.assertEqual(response.status_code != 304,
+                                     number in changed)
+
+    def test_comment_author_renamed(self):
+        commenter = User.objects.create_user(username='commenter')
+        Comment.objects.create(post=self.post, author=commenter, text='text')
+        url = self.urls[3]
+        anonymous = Client()
+        anonymous.get(url)
+        etag = self.client.get(url)['ETag']
+        commenter.username = 'renamed'
+        commenter.save()
+        self.assertContains(anonymous.get(url), 'renamed')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_other_user_gets_own_etag(self):
+        etag = self.client.get(self.urls[0])['ETag']
+        self.client.force_login(self.author)
+        response = self.client.get(self.urls[0], HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_anonymous_not_modified(self):
+        self.client.logout()
+        etag = self.client.get(self.urls[0])['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.urls[0], HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+class PublishedTest(TestCase):
+    """Test posts off moderation are hidden from public pages"""
+    def setUp(self) -> None:
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(title='test_group',
+                                          slug='test_group_slug')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.post = Post.objects.create(author=self.author, group=self.group,
+                                        title='Hidden_title', text='text',
+                                        slug='hidden', moderation=False)
+        Post.objects.create(author=self.author, group=self.group,
+                            title='Shown_title', text='text', slug='shown')
+        run_pending()
+
+    def test_hidden_from_public_pages(self):
+        self.client.force_login(self.reader)
+        urls = [reverse('main_page'),
+                reverse('group', args=['test_group_slug']),
+                reverse('profile', args=['author']),
+                reverse('your_follows', args=['reader']),
+                reverse('search') + '?q=title']
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, 'Shown_title')
+                self.assertNotContains(response, 'Hidden_title')
+        response = self.client.get(
+            reverse('post_view', args=['author', 'hidden']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_author_sees_own_hidden_post(self):
+        self.client.force_login(self.author)
+        response = self.client.get(reverse('profile', args=['author']))
+        self.assertContains(response, 'Hidden_title')
+        response = self.client.get(
+            reverse('post_view', args=['author', 'hidden']))
+        self.assertContains(response, 'Hidden_title')
+
+    def test_group_off_moderation_hides_posts(self):
+        Group.objects.filter(pk=self.group.pk).update(moderation=False)
+        response = self.client.get(reverse('main_page'))
+        self.assertNotContains(response, 'Shown_title')
+        response = self.client.get(reverse('group', args=['test_group_slug']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_publish_action_is_one_update(self):
+        admin = PostAdmin(Post, site)
+        with CaptureQueriesContext(connection) as queries:
+            admin.publish(None, Post.objects.filter(group=self.group))
+        self.assertEqual(
+            [query['sql'].split()[0] for query in queries].count('UPDATE'), 1)
+        response = self.client.get(reverse('main_page'))
+        self.assertContains(response, 'Hidden_title')
+
 
 class DeletePostTest(TestCase):
     """Test only author can delete his post"""
@@ -312,3 +1185,215 @@ class Profile(TestCase):
         response = self.client.get(
             reverse('profile', args=[self.user.username]))
         self.assertEqual(response.status_code, 200)
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class QueryBudgetTest(TestCase):
+    """Test views stay within their query budgets"""
+    def setUp(self) -> None:
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser',
+                                             password='difficult_password')
+        self.client.login(username='testuser', password='difficult_password')
+        self.group = Group.objects.create(title='test_group',
+                                          slug='test_group_slug')
+        Follow.objects.create(user=self.user, group=self.group)
+        cache.clear()
+        for i in range(5):
+            author = User.objects.create_user(username=f'author{i}')
+            post = Post.objects.create(author=author, group=self.group,
+                                       title=f'Title{i}', text=f'Text{i}',
+                                       slug=f'slug_{i}',
+                                       image=f'posts/image_{i}.jpg')
+            Comment.objects.create(post=post, author=author, text='text')
+            Comment.objects.create(post=post, author=self.user, text='text')
+
+    def test_views_within_budget(self):
+        urls = [
+            reverse('main_page'),
+            reverse('group_list'),
+            reverse('group', args=['test_group_slug']),
+            reverse('profile', args=['author1']),
+            reverse('profile', args=['testuser']),
+            reverse('post_view', args=['author1', 'slug_1']),
+            reverse('search') + '?q=Title',
+            reverse('your_follows', args=['testuser']),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_post_of_author_without_profile(self):
+        author = User.objects.get(username='author1')
+        author.profile.delete()
+        cache.clear()
+        response = self.client.get(reverse('post_view',
+                                           args=['author1', 'slug_1']))
+        self.assertEqual(response.status_code, 200)
+
+    def test_template_time_measured(self):
+        self.client.get(reverse('main_page'))
+        self.client.get(reverse('main_page'))
+        response = self.client.get(reverse('metrics'))
+        seconds = re.search(
+            r'yatube_template_seconds_total{view="main_page"} (\S+)',
+            response.content.decode())
+        self.assertGreater(float(seconds[1]), 0)
+
+    def test_exceeded_budget_lists_queries(self):
+        with patch.object(MainPageView, 'query_budget', 0):
+            with self.assertRaisesRegex(QueryBudgetExceeded,
+                                        r'main_page: \d+ queries, budget 0'
+                                        r'\n1\. SELECT'):
+                self.client.get(reverse('main_page'))
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('main_page'))
+        response = self.client.get(reverse('metrics'))
+        self.assertContains(response,
+                            'yatube_requests_total{view="main_page"}')
+
+
+class BenchmarkTest(TestCase):
+    """Test benchmark seeds data, replays mix and finds regressions"""
+    def test_replay_and_compare(self):
+        benchmark.seed(users=5, groups=2, posts=20, comments=20, follows=5)
+        result = benchmark.run_inprocess(requests=30)
+        self.assertEqual(result['requests'], 30)
+        names = {item['name'] for item in benchmark.load_mix()}
+        self.assertLessEqual(set(result['results']), names)
+        self.assertEqual(benchmark.compare(result, result), [])
+
+        slower = json.loads(json.dumps(result))
+        for values in slower['results'].values():
+            values['queries'] += 1
+        self.assertEqual(len(benchmark.compare(slower, result)),
+                         len(result['results']))
+
+    def test_own_cache(self):
+        cache.set('key', 'real')
+        with benchmark.own_cache():
+            self.assertIsNone(cache.get('key'))
+            cache.set('key', 'benchmark')
+            location = settings.CACHES['default']['LOCATION']
+        self.assertEqual(cache.get('key'), 'real')
+        self.assertFalse(exists(location))
+
+
+class AsyncViewsTest(TransactionTestCase):
+    """Test async views query concurrently outside of transaction"""
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username='testuser')
+        self.author = User.objects.create_user(username='author')
+        self.group = Group.objects.create(title='test_group',
+                                          slug='test_group_slug')
+        Follow.objects.create(user=self.user, author=self.author)
+        Post.objects.create(author=self.author, group=self.group,
+                            title='Title', text='Text', slug='slug')
+        run_pending()
+        cache.clear()
+
+    async def test_views_render_with_parallel_queries(self):
+        client = AsyncClient()
+        await sync_to_async(client.force_login)(self.user)
+        with patch('Yatube.aio.asyncio.gather',
+                   side_effect=asyncio.gather) as parallel:
+            for url in (reverse('main_page'),
+                        reverse('profile', args=['author']),
+                        reverse('group', args=['test_group_slug']),
+                        reverse('your_follows', args=['testuser'])):
+                with self.subTest(url=url):
+                    response = await client.get(url)
+                    self.assertContains(response, 'Title')
+            response = await client.get(reverse('profile', args=['author']))
+            self.assertTrue(response.context['following'])
+            self.assertEqual(parallel.call_count, 3)
+        response = await client.get(reverse('profile', args=['nobody']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_benchmark_counts_queries_of_all_threads(self):
+        benchmark.seed(users=2, groups=1, posts=2, comments=0, follows=1)
+        mix = [{'name': 'group', 'path': '/group/{group}/'}]
+        queries = []
+        for parallel in (False, True):
+            cache.clear()
+            groups.clear()
+            with self.settings(ASYNC_PARALLEL_QUERIES=parallel):
+                result = benchmark.run_inprocess(requests=1, mix=mix)
+            queries.append(result['results']['group']['queries'])
+        self.assertEqual(queries[0], queries[1])
+
+
+class QueryPlanTest(TestCase):
+    """Test list views read big tables by index, not by full scan"""
+    big_tables = ('posts_post', 'follows_follow', 'follows_feedentry')
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.bulk_create(User(username=f'user{i}') for i in range(200))
+        Group.objects.bulk_create(
+            Group(title=f'group{i}', slug=f'group{i}') for i in range(20))
+        users = list(User.objects.order_by('id'))
+        groups = list(Group.objects.order_by('id'))
+        Post.objects.bulk_create(
+            (Post(author=users[i % 200], group=groups[i % 20],
+                  title=f'Title{i}', text='text', slug=f'slug{i}')
+             for i in range(20000)), batch_size=1000)
+        cls.reader = users[0]
+        Follow.objects.bulk_create(
+            Follow(user=user, author=users[(i + 1) % 200])
+            for i, user in enumerate(users))
+        Follow.objects.bulk_create(
+            Follow(user=user, group=groups[i % 20])
+            for i, user in enumerate(users))
+        FeedEntry.objects.bulk_create(
+            (FeedEntry(user_id=users[i % 200].id, post_id=post_id,
+                       published_date=published_date)
+             for i, (post_id, published_date) in enumerate(
+                Post.objects.values_list('id', 'published_date'))),
+            batch_size=1000)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def full_scans(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(f'EXPLAIN {sql}')
+                plan = '\n'.join(row[0] for row in cursor.fetchall())
+                pattern = r'Seq Scan on ({})\b'
+            else:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plan = '\n'.join(row[-1] for row in cursor.fetchall())
+                pattern = r'SCAN ({})(?! USING)\b'
+        return re.findall(pattern.format('|'.join(self.big_tables)), plan)
+
+    def assertIndexScans(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        for query in queries:
+            if query['sql'].startswith('SELECT'):
+                self.assertEqual(self.full_scans(query['sql']), [],
+                                 f'{url}: {query["sql"]}')
+
+    def test_list_views(self):
+        self.client.force_login(self.reader)
+        post = Post.objects.get(slug='slug10000')
+        cursor = KeysetPaginator(Post.objects.all(), 3).encode(post)
+        feed, keys = follows_feed(self.reader)
+        feed_cursor = KeysetPaginator(feed, 3, keys).encode(feed[10])
+        views = [
+            (reverse('main_page'), None),
+            (reverse('main_page'), {'after': cursor}),
+            (reverse('group', args=['group5']), None),
+            (reverse('group', args=['group5']), {'after': cursor}),
+            (reverse('profile', args=['user7']), None),
+            (reverse('profile', args=['user7']), {'after': cursor}),
+            (reverse('post_view', args=['user0', 'slug10000']), None),
+            (reverse('your_follows', args=[self.reader.username]), None),
+            (reverse('your_follows', args=[self.reader.username]),
+             {'after': feed_cursor}),
+        ]
+        for url, params in views:
+            with self.subTest(url=url, params=params):
+                self.assertIndexScans(url, params)
@@ -0,0 +1,99 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from jobs.queue import task
+from .models import ImageVariant, Post
+
+try:
+    import pillow_avif  # noqa: F401 registers AVIF format in Pillow
+except ImportError:
+    pass
+
+# Width to height of card image
+ASPECT = 3
+
+# Pillow format, MIME type and save options of variant formats
+FORMATS = {
+    'avif': ('AVIF', 'image/avif', {'quality': 60}),
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 6}),
+    'jpeg': ('JPEG', 'image/jpeg', {'quality': 85, 'optimize': True,
+                                    'progressive': True}),
+}
+
+
+def formats():
+    """Configured variant formats which installed Pillow can write"""
+    Image.init()
+    return [name for name in settings.POST_IMAGE_FORMATS
+            if FORMATS[name][0] in Image.SAVE]
+
+
+def widths(source_width):
+    """Configured widths not upscaling source, or source width itself"""
+    return [width for width in settings.POST_IMAGE_WIDTHS
+            if width <= source_width] or [source_width]
+
+
+def encode(image):
+    """Variants of image as (format, width, height, bytes).
+
+    Image is turned upright by its EXIF orientation and cropped to card
+    aspect. Variants are saved without EXIF and other metadata"""
+    with Image.open(image) as source:
+        source = ImageOps.exif_transpose(source).convert('RGB')
+    names = formats()
+    for width in widths(source.width):
+        height = max(1, width // ASPECT)
+        resized = ImageOps.fit(source, (width, height), Image.LANCZOS)
+        for name in names:
+            pillow_format, _, options = FORMATS[name]
+            content = BytesIO()
+            resized.save(content, pillow_format, **options)
+            yield name, width, height, content.getvalue()
+
+
+@task
+def make_variants(post_id):
+    """Replace variants of post image, unless image changed meanwhile"""
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None or not post.image:
+        return
+    stem = os.path.splitext(os.path.basename(post.image.name))[0]
+    with post.image.open('rb') as image:
+        variants = [
+            ImageVariant(
+                post=post, format=name, width=width, height=height,
+                size=len(content), file=default_storage.save(
+                    f'posts/variants/{post_id}/{stem}-{width}.{name}',
+                    ContentFile(content)))
+            for name, width, height, content in encode(image)]
+    with transaction.atomic():
+        current = Post.objects.filter(
+            pk=post_id, image=post.image.name).update(
+            updated=timezone.now())
+        if current:
+            post.image_variants.all().delete()
+            ImageVariant.objects.bulk_create(variants)
+    if not current:
+        for variant in variants:
+            default_storage.delete(variant.file.name)
+
+
+def schedule(post_id):
+    """Make image variants by background job. Requests made before job
+    starts are served by one job"""
+    make_variants.enqueue(post_id, key=f'image_variants:{post_id}')
+
+
+@task
+def delete_file(name):
+    """Delete variant file, queued with deletion of its row so file is
+    kept if transaction is rolled back"""
+    default_storage.delete(name)
@@ -0,0 +1,169 @@
+import os
+import tempfile
+from functools import wraps
+from io import BytesIO
+
+from django import forms
+from django.conf import settings
+from django.core.exceptions import RequestDataTooBig
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import (SimpleUploadedFile,
+                                            TemporaryUploadedFile,
+                                            UploadedFile)
+from django.core.files.uploadhandler import (FileUploadHandler,
+                                             StopFutureHandlers)
+from django.template.defaultfilters import filesizeformat
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from PIL import Image
+
+# Bytes of image read at most to find its format and dimensions
+HEADER_LIMIT = 256 * 1024
+
+
+def read_header(head):
+    """Format, width and height of image by its first bytes, without
+    decoding pixels. None if bytes are not enough or format not allowed,
+    DecompressionBombError if image is way too large"""
+    try:
+        with Image.open(BytesIO(head),
+                        formats=settings.POST_UPLOAD_FORMATS) as image:
+            return (image.format, *image.size)
+    except (OSError, SyntaxError, ValueError, EOFError):
+        return None
+
+
+def too_large(header):
+    """Whether image of header breaks dimension limits"""
+    _, width, height = header
+    return (max(width, height) > settings.POST_UPLOAD_MAX_SIDE or
+            width * height > settings.POST_UPLOAD_MAX_PIXELS)
+
+
+def _too_large_error():
+    return (f'Изображение больше {settings.POST_UPLOAD_MAX_SIDE} точек '
+            f'по стороне или {settings.POST_UPLOAD_MAX_PIXELS} точек всего')
+
+
+def temp_dir():
+    """Directory of files being uploaded next to media files, so storing
+    them is renaming instead of copying"""
+    location = getattr(default_storage, 'location', None)
+    if location is None:
+        return settings.FILE_UPLOAD_TEMP_DIR
+    directory = os.path.join(location, '.uploads')
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+class StreamedUpload(TemporaryUploadedFile):
+    """Uploaded file written to temporary file of temp_dir()"""
+    def __init__(self, name, content_type, charset, content_type_extra=None):
+        _, ext = os.path.splitext(name)
+        file = tempfile.NamedTemporaryFile(suffix='.upload' + ext,
+                                           dir=temp_dir())
+        UploadedFile.__init__(self, file, name, content_type, 0, charset,
+                              content_type_extra)
+        self.image_header = None
+
+
+class RejectedUpload(SimpleUploadedFile):
+    """Placeholder of upload dropped by ImageUploadHandler"""
+    def __init__(self, name, error):
+        super().__init__(name, b'')
+        self.upload_error = error
+
+
+class ImageUploadHandler(FileUploadHandler):
+    """Streams uploaded images to disk, checking their size while data
+    arrives and format and dimensions by header before any decoding.
+
+    File which breaks limits stops being written and reaches form as
+    RejectedUpload carrying error. Body bigger than any acceptable one
+    is refused before reading"""
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        limit = (settings.POST_UPLOAD_MAX_BYTES +
+                 (settings.DATA_UPLOAD_MAX_MEMORY_SIZE or 0))
+        if content_length > limit:
+            raise RequestDataTooBig('Upload exceeds POST_UPLOAD_MAX_BYTES')
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file = StreamedUpload(self.file_name, self.content_type,
+                                   self.charset, self.content_type_extra)
+        self.head = b''
+        self.error = None
+        raise StopFutureHandlers()
+
+    def reject(self, error):
+        self.error = error
+        self.file.close()
+        self.head = b''
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.error:
+            return None
+        if start + len(raw_data) > settings.POST_UPLOAD_MAX_BYTES:
+            self.reject('Файл больше '
+                        f'{filesizeformat(settings.POST_UPLOAD_MAX_BYTES)}')
+            return None
+        if self.file.image_header is None:
+            self.head += raw_data
+            try:
+                header = read_header(self.head)
+            except Image.DecompressionBombError:
+                self.reject(_too_large_error())
+                return None
+            if header is not None:
+                self.file.image_header = header
+                self.head = b''
+                if too_large(header):
+                    self.reject(_too_large_error())
+                    return None
+            elif len(self.head) >= HEADER_LIMIT:
+                self.reject('Загрузите правильное изображение')
+                return None
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if not self.error and self.file.image_header is None:
+            self.reject('Загрузите правильное изображение')
+        if self.error:
+            return RejectedUpload(self.file_name, self.error)
+        self.file.seek(0)
+        self.file.size = file_size
+        return self.file
+
+    def upload_interrupted(self):
+        if hasattr(self, 'file'):
+            self.file.close()
+
+
+def image_uploads(view):
+    """Let view read uploaded files through ImageUploadHandler.
+
+    Handlers have to be set before anything reads request body, so CSRF
+    check, which reads it, is done after that"""
+    protected = csrf_protect(view)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers = [ImageUploadHandler(request)]
+        return protected(request, *args, **kwargs)
+    return csrf_exempt(wrapper)
+
+
+class UploadedImageField(forms.ImageField):
+    """Image field trusting header checked by ImageUploadHandler instead
+    of opening image once more"""
+    def to_python(self, data):
+        error = getattr(data, 'upload_error', None)
+        if error:
+            raise forms.ValidationError(error, code='invalid_image')
+        header = getattr(data, 'image_header', None)
+        if header is None:
+            return super().to_python(data)
+        data = forms.FileField.to_python(self, data)
+        data.content_type = Image.MIME.get(header[0])
+        return data
@@ -11,11 +11,16 @@ urlpatterns = [
          name='delete_comment'),
     path('group_list/', views.GroupList.as_view(), name='group_list'),
     path('group/<slug:group_slug>/', views.GroupView.as_view(), name='group'),
+    path('search/', views.SearchView.as_view(), name='search'),
     path('<str:username>/', views.ProfileView.as_view(), name='profile'),
     path('<str:username>/<slug:post_slug>/', views.PostAndCommentView.as_view(),
          name='post_view'),
     path('<str:username>/<slug:post_slug>/edit/', views.PostEditView.as_view(),
          name='post_edit'),
+    path('<str:username>/<slug:post_slug>/image/',
+         views.PostImageView.as_view(), name='original_image'),
+    path('<str:username>/<slug:post_slug>/comments/',
+         views.CommentsView.as_view(), name='comments'),
     path('<str:username>/<slug:post_slug>/comment/',
          views.PostAndCommentView.as_view(), name='add_comment'),
 ]
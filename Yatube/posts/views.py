@@ -1,114 +1,324 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.core.paginator import Paginator
 from django.db.models import Q
+from django.http import Http404, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.utils.decorators import method_decorator
+from django.urls import reverse
+from django.utils.http import urlencode
 from django.views import View
-from django.views.decorators.cache import cache_page
 
 from follows.models import Follow
+from Users import profiles
+from Yatube.aio import AsyncView, gather, render_async
+from Yatube.caching import cache_view, get_or_compute
+from Yatube.conditional import conditional
+from Yatube.invalidation import depend, list_tag, tag
+from Yatube.media import send_file
+from . import cards, freshness, groups, permalinks
 from .forms import PostForm, PostEditForm, AddCommentForm
 from .models import Post, Group, Comment
+from .paginator import KeysetPaginator
+from .search import search_posts
+from .uploads import image_uploads
 
 
 class PaginatePage:
-    """ Subclass for pagination of queryset"""
-    def paginate(self, request, queryset):
-        paginator = Paginator(queryset, 3)
-        page_number = request.GET.get('page')
-        page = paginator.get_page(page_number)
+    """ Subclass for pagination of queryset.
+
+    Pages are addressed by ?after=/?before= cursors, old ?page= links
+    are still served by numbered paginator up to LEGACY_PAGE_MAX. Image
+    variants of posts on page are fetched by one query"""
+    per_page = 3
+    keys = ('published_date', 'id')
+
+    def paginate(self, request, queryset, keys=None):
+        keys = keys or self.keys
+        if 'page' in request.GET:
+            number = request.GET['page']
+            if number.isdigit() and int(number) > settings.LEGACY_PAGE_MAX:
+                raise Http404
+            paginator = Paginator(
+                queryset.order_by(*(f'-{key}' for key in keys)),
+                self.per_page)
+            page = paginator.get_page(request.GET['page'])
+            page.object_list = list(page.object_list)
+        else:
+            paginator = KeysetPaginator(queryset, self.per_page, keys)
+            page = paginator.get_page(after=request.GET.get('after'),
+                                      before=request.GET.get('before'))
+        cards.prefetch_images(page.object_list)
         return paginator, page
 
 
-@method_decorator(cache_page(60 * 3, key_prefix="main_page"), name='dispatch')
-class MainPageView(View, PaginatePage):
+@method_decorator([conditional(freshness.main_page_version),
+                   cache_view(settings.PAGE_CACHE_TIMEOUT)], name='get')
+class MainPageView(AsyncView, PaginatePage):
     """Output of main page with all existing posts"""
-    def get(self, request):
-        posts = Post.objects.select_related('author', 'group').all().order_by(
+    query_budget = 4
+
+    async def get(self, request):
+        depend(list_tag(Post))
+        posts = Post.published.select_related('author', 'group').order_by(
             '-published_date')
-        paginator, page = self.paginate(request, posts)
-        return render(request, 'index.html',
-                      {'page': page, 'paginator': paginator})
+        paginator, page = await sync_to_async(self.paginate)(request, posts)
+        return await render_async(request, 'index.html',
+                                  {'page': page, 'paginator': paginator})
 
 
+@method_decorator(cache_view(settings.PAGE_CACHE_TIMEOUT), name='get')
 class GroupList(View):
-    """Output of all existing and moderated groups"""
+    """Directory of moderated groups by title with counts of their posts
+    and followers.
+
+    Page is cached till any group on it, its posts or followers change"""
+    query_budget = 3
+
+    def directory(self, after, before):
+        depend(list_tag(Group))
+        paginator = KeysetPaginator(
+            Group.objects.filter(moderation=True).with_counts(),
+            settings.GROUP_LIST_PAGE_SIZE, ('title', 'id'), descending=False)
+        page = paginator.get_page(after=after, before=before)
+        depend(*(tag(Group, group.pk) for group in page))
+        return {'object_list': list(page),
+                'has_next': page.has_next(),
+                'has_previous': page.has_previous(),
+                'next_cursor': page.next_cursor,
+                'previous_cursor': page.previous_cursor}
+
     def get(self, request):
-        return render(request, 'group_list.html',
-                      {'groups': Group.objects.filter(moderation=True)})
+        after, before = request.GET.get('after'), request.GET.get('before')
+        page = get_or_compute(f'group_list:{after}:{before}',
+                              lambda: self.directory(after, before),
+                              settings.PAGE_CACHE_TIMEOUT)
+        return render(request, 'group_list.html', {'page': page})
 
 
-class GroupView(View, PaginatePage):
-    """Posts output of exact group"""
-    def get(self, request, group_slug):
-        group = Group.objects.select_related('creator').get(slug=group_slug)
-        posts = group.posts.select_related('author', 'group').all().order_by(
-            '-published_date')
-        paginator, page = self.paginate(request, posts)
-        return render(request, 'group.html', {
+def resolve_author(username):
+    """User with profile by username in any case, 404 if there is none"""
+    author = profiles.resolve(username)
+    if author is None:
+        raise Http404
+    return author
+
+
+def is_following(request, **lookups):
+    """Whether current user follows author or group of lookups"""
+    if request.user.is_anonymous:
+        return False
+    return Follow.objects.filter(user=request.user, **lookups).exists()
+
+
+@method_decorator([conditional(freshness.group_version),
+                   cache_view(settings.PAGE_CACHE_TIMEOUT)], name='get')
+class GroupView(AsyncView, PaginatePage):
+    """Posts output of exact group.
+
+    Group is resolved by slug from memory of process, then group with
+    counters, page of its posts and following are queried concurrently"""
+    query_budget = 8
+
+    async def get(self, request, group_slug):
+        ref = await sync_to_async(groups.resolve)(group_slug)
+        if ref is None or not ref.moderation:
+            raise Http404
+        posts = Post.published.select_related('author', 'group').filter(
+            group_id=ref.id).order_by('-published_date')
+        group, (paginator, page), following = await gather(
+            lambda: get_object_or_404(
+                Group.objects.with_counts().select_related('creator'),
+                pk=ref.id, moderation=True),
+            lambda: self.paginate(request, posts),
+            lambda: is_following(request, group_id=ref.id))
+        depend(tag(Group, group.pk))
+        return await render_async(request, 'group.html', {
             'group': group,
             'page': page,
             'paginator': paginator,
-            'following': Follow.objects.filter(
-                user=None if request.user.is_anonymous else request.user,
-                group=group).exists()
+            'following': following,
+        })
+
+
+@method_decorator([conditional(freshness.profile_version),
+                   cache_view(settings.PAGE_CACHE_TIMEOUT)], name='get')
+class ProfileView(AsyncView, PaginatePage):
+    """Users profile with posts if they exist.
+
+    Author with counters is resolved from cache, then page of posts and
+    following are queried concurrently. Username in other case is
+    redirected to the right one"""
+    query_budget = 7
+
+    def author_posts(self, request, author):
+        """Published posts of author, all of them for author himself"""
+        posts = Post.objects if request.user == author else Post.published
+        return posts.select_related('author__profile', 'group').filter(
+            author_id=author.pk).order_by('-published_date')
+
+    async def get(self, request, username):
+        author = await sync_to_async(resolve_author)(username)
+        if author.username != username:
+            return redirect('profile', author.username, permanent=True)
+        (paginator, page), following = await gather(
+            lambda: self.paginate(request, self.author_posts(request, author)),
+            lambda: is_following(request, author_id=author.pk))
+        depend(tag(User, author.pk))
+        return await render_async(request, 'profile.html', {
+            'page': page,
+            'paginator': paginator,
+            'author': author,
+            'following': following,
+        })
+
+
+class SearchView(View, PaginatePage):
+    """Posts found by text ordered by relevance"""
+    query_budget = 4
+
+    def get(self, request):
+        query = request.GET.get('q', '').strip()
+        if not query:
+            return render(request, 'search.html', {'query': query})
+        posts, keys = search_posts(
+            Post.published.select_related('author', 'group'), query)
+        paginator, page = self.paginate(request, posts, keys)
+        return render(request, 'search.html', {
+            'query': query,
+            'page': page,
+            'paginator': paginator,
+            'page_query': urlencode({'q': query}) + '&',
         })
 
 
-class ProfileView(View, PaginatePage):
-    """Users profile with posts if they exist"""
-    def get(self, request, username):
+class CommentsPage:
+    """Subclass for cursor pagination of post comments, oldest first"""
+    comments_per_page = 20
+
+    def comments_page(self, request, post):
+        paginator = KeysetPaginator(
+            post.comments.select_related('author'), self.comments_per_page,
+            ('published_date', 'id'), descending=False)
+        page = paginator.get_page(after=request.GET.get('after'))
+        depend(*(tag(User, comment.author_id) for comment in page))
+        return page
+
+
+class PostMoved(Exception):
+    """Post asked for by GET at its former address"""
+    def __init__(self, post):
+        super().__init__(post)
+        self.post = post
+
+
+class PostPage:
+    """Subclass for views of post addressed by author and slug.
+
+    Post is found by id cached by address. GET of former address of post is
+    redirected permanently to the same view at the current one, other
+    methods act on the post at once"""
+    def get_post(self, request, username, post_slug, posts=None):
+        """Post of author by slug out of posts, all by default, 404 if
+        there is none"""
+        posts = Post.objects.all() if posts is None else posts
+        author = resolve_author(username)
+        pk = permalinks.cached_id(author, post_slug)
+        address = {'author_id': author.pk, 'slug': post_slug}
+        post = posts.filter(**address, **({'pk': pk} if pk else {})).first()
+        if post is None:
+            moved = permalinks.moved_post(author, post_slug)
+            if moved is None:
+                raise Http404
+            if request.method in ('GET', 'HEAD'):
+                raise PostMoved(moved)
+            post, author = get_object_or_404(posts, pk=moved.pk), moved.author
+        elif pk is None:
+            permalinks.remember(author, post_slug, post.pk)
+        post.author = author
+        return post
+
+    def dispatch(self, request, *args, **kwargs):
         try:
-            posts = Post.objects.select_related('author', 'group').filter(
-                author__username=username).order_by(
-                '-published_date')
-            author = posts.first().author
-            paginator, page = self.paginate(request, posts)
-            return render(request, 'profile.html', {
-                'page': page,
-                'paginator': paginator,
-                'author': author,
-                'following': Follow.objects.filter(
-                    user=None if request.user.is_anonymous else request.user,
-                    author=author).exists()
-            })
-        except AttributeError:
-            author = User.objects.get(username=username)
-            return render(request, 'profile.html', {
-                'author': author,
-                'following': Follow.objects.filter(
-                    user=None if request.user.is_anonymous else request.user,
-                    author=author).exists()
-            })
+            return super().dispatch(request, *args, **kwargs)
+        except PostMoved as moved:
+            match = request.resolver_match
+            url = reverse(match.view_name, kwargs={
+                **match.kwargs, 'username': moved.post.author.username,
+                'post_slug': moved.post.slug})
+            if request.META.get('QUERY_STRING'):
+                url += '?' + request.META['QUERY_STRING']
+            return redirect(url, permanent=True)
 
 
-class PostAndCommentView(View):
+class PostAndCommentView(PostPage, View, CommentsPage):
     """Individual post page with comments"""
+    query_budget = 8
+
+    @method_decorator([conditional(freshness.post_version),
+                       cache_view(settings.PAGE_CACHE_TIMEOUT)])
     def get(self, request, username, post_slug):
-        post = get_object_or_404(Post, author__username=username,
-                                 slug=post_slug)
+        post = self.get_post(request, username, post_slug,
+                             Post.objects.visible_to(request.user))
+        depend(tag(Post, post.pk), tag(User, post.author_id))
         return render(request, 'post.html', {
             'post': post,
-            'comments': post.comments.all(),
+            'comments': self.comments_page(request, post),
             'form': AddCommentForm(),
             'author': post.author,
-            'following': Follow.objects.filter(
-                user=None if request.user.is_anonymous else request.user,
-                author=post.author).exists()
+            'following': is_following(request, author_id=post.author_id),
         })
 
     def post(self, request, username, post_slug):
         form = AddCommentForm(request.POST)
-        if form.is_valid():
-            form = form.save()
-            form.post = Post.objects.get(slug=post_slug)
-            form.author = request.user
-            form.save()
+        if form.is_valid() and request.user.is_authenticated:
+            comment = form.save(commit=False)
+            comment.post = self.get_post(request, username, post_slug)
+            comment.author = request.user
+            comment.save()
         return redirect(request.path)
 
 
-@method_decorator(login_required, name='dispatch')
+class CommentsView(PostPage, View, CommentsPage):
+    """Next batch of post comments as HTML fragment or JSON"""
+    query_budget = 5
+
+    def get(self, request, username, post_slug):
+        post = self.get_post(request, username, post_slug,
+                             Post.objects.visible_to(request.user))
+        comments = self.comments_page(request, post)
+        if request.GET.get('format') == 'json':
+            return JsonResponse({
+                'comments': [{
+                    'id': comment.id,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'published_date': comment.published_date.isoformat(),
+                } for comment in comments],
+                'next': comments.next_cursor,
+            })
+        return render(request, 'include/comment_list.html',
+                      {'post': post, 'comments': comments})
+
+
+class PostImageView(PostPage, View):
+    """Original post image, for those who may see the post.
+
+    Originals keep metadata stripped from variants on cards, so they are
+    not served from public media location"""
+    query_budget = 3
+
+    def get(self, request, username, post_slug):
+        post = self.get_post(
+            request, username, post_slug,
+            Post.objects.visible_to(request.user).exclude(image='').filter(
+                image__isnull=False))
+        return send_file(post.image.name)
+
+
+@method_decorator([login_required, image_uploads], name='dispatch')
 class CreatePostView(View):
     """Post creation page"""
     def get(self, request):
@@ -119,10 +329,9 @@ class CreatePostView(View):
             })
 
     def post(self, request):
-        form = PostForm(request.POST, files=request.FILES or None)
+        form = PostForm(request.POST, files=request.FILES or None,
+                        instance=Post(author=request.user))
         if form.is_valid():
-            form = form.save()
-            form.author = request.user
             form.save()
             return redirect('/')
         else:
@@ -133,12 +342,12 @@ class CreatePostView(View):
                 })
 
 
-@method_decorator(login_required, name='dispatch')
-class PostEditView(View):
+@method_decorator([login_required, image_uploads], name='dispatch')
+class PostEditView(PostPage, View):
     """Edit post page"""
     def get(self, request, username, post_slug):
-        post = Post.objects.get(slug=post_slug)
-        if request.user.username == post.author.username:
+        post = self.get_post(request, username, post_slug)
+        if request.user == post.author:
             return render(request, 'create_edit_post.html',
                           {'form': PostEditForm(instance=post),
                            'post_slug': post_slug,
@@ -149,14 +358,14 @@ class PostEditView(View):
             return redirect('post_view', username=username, post_slug=post_slug)
 
     def post(self, request, username, post_slug):
-        form = PostEditForm(request.POST, files=request.FILES or None)
-        post = Post.objects.get(slug=post_slug)
+        post = self.get_post(request, username, post_slug)
+        if request.user != post.author:
+            return redirect('post_view', username=post.author.username,
+                            post_slug=post.slug)
+        form = PostEditForm(request.POST, files=request.FILES or None,
+                            instance=post)
         if form.is_valid():
-            post.group = form.cleaned_data['group']
-            post.title = form.cleaned_data['title']
-            post.text = form.cleaned_data['text']
-            post.image = form.cleaned_data['image']
-            post.save()
+            form.save()
             return redirect('/')
         else:
             return render(request, 'create_edit_post.html', {
@@ -167,10 +376,10 @@ class PostEditView(View):
             })
 
 
-class DeletePostView(View):
+class DeletePostView(PostPage, View):
     """Delete post page"""
     def post(self, request, post_slug):
-        post = Post.objects.get(slug=post_slug)
+        post = self.get_post(request, request.user.username, post_slug)
         if request.user == post.author:
             post.delete()
         return redirect('profile', username=request.user.username)